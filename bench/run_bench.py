@@ -0,0 +1,176 @@
+"""Headless performance benchmarks for the simulation and AI.
+
+Runs CaughtByTheEnemy AI vs AI and a generated stress scenario
+(bench/scenarios/Stress) without a window, timing ability target
+selection, path finding and whole AI turns.
+
+    python bench/run_bench.py -o results.json
+    python bench/run_bench.py -o new.json --compare results.json
+
+With --compare, any benchmark whose mean got slower than the baseline by
+more than --threshold is flagged and the exit code is 1."""
+
+import sys, os, time, random
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+root = os.path.split(os.path.split(os.path.abspath(__file__))[0])[0]
+sys.path.insert(0, root)
+os.chdir(root) #scenarios load their files relative to here
+
+from lib import headless, ai_search
+
+STRESS_DIR = 'bench/scenarios/'
+
+class Timings(object):
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds*1000.0)
+
+    def time(self, name, func, *args):
+        t = time.time()
+        ret = func(*args)
+        self.add(name, time.time()-t)
+        return ret
+
+    def summary(self):
+        ret = {}
+        for name, s in self.samples.items():
+            s = sorted(s)
+            ret[name] = {'runs':len(s),
+                         'mean':sum(s)/len(s),
+                         'median':s[len(s)/2],
+                         'min':s[0],
+                         'max':s[-1],
+                         'total':sum(s)}
+        return ret
+
+def bench_abilities(timings, prefix, game, sample, rand):
+    """Time target selection and path finding for a sample of units"""
+    units = [u for u in game.mod.units if not u.dead and u.actions]
+    units = rand.sample(units, min(sample, len(units)))
+    for u in units:
+        enemies = [e for e in game.mod.units if e.team != u.team and not e.dead]
+        for a in u.actions:
+            if a.name == 'Move':
+                u.cur_ap = u.action_points
+                timings.time(prefix+'move.get_select', a.get_select)
+                if enemies:
+                    target = rand.choice(enemies).pos
+                    bt, pt = a._get_blocked_tiles()
+                    bt = [i for i in bt if i != target]
+                    timings.time(prefix+'move.get_path', a.get_path,
+                                 u.pos, target, bt)
+            else:
+                timings.time(prefix+'attack.get_select', a.get_select)
+
+def bench_game(timings, prefix, game, max_turns):
+    """Play AI vs AI, timing every turn"""
+    teams = game.mod.config.teams
+    winner = None
+    turns = 0
+    while not winner and turns < max_turns:
+        for team in teams:
+            winner = timings.time(prefix+'turn', game.play_turn, team)
+            turns += 1
+            if winner:
+                break
+    return winner, turns
+
+def run(options):
+    timings = Timings()
+    rand = random.Random(options.seed)
+    results = {}
+
+    if not options.skip_main:
+        for i in xrange(options.games):
+            game = headless.HeadlessGame('CaughtByTheEnemy')
+            bench_abilities(timings, 'main.', game, options.sample, rand)
+            t = time.time()
+            winner, turns = bench_game(timings, 'main.', game, 200)
+            timings.add('main.game', time.time()-t)
+            results['main.winner'] = winner
+            results['main.turns'] = turns
+
+    if not options.skip_stress:
+        opts = {'width':options.width, 'height':options.height,
+                'units':options.units, 'turns':options.turns,
+                'seed':options.seed}
+        t = time.time()
+        game = headless.HeadlessGame('Stress', STRESS_DIR, opts)
+        timings.add('stress.load', time.time()-t)
+        bench_abilities(timings, 'stress.', game, options.sample, rand)
+        t = time.time()
+        winner, turns = bench_game(timings, 'stress.', game, options.turns*2)
+        timings.add('stress.game', time.time()-t)
+
+    ai_search.close_pool()
+    return {'meta':{'time':time.time(),
+                    'python':sys.version.split()[0],
+                    'platform':sys.platform,
+                    'options':dict(options.__dict__)},
+            'results':results,
+            'timings':timings.summary()}
+
+def compare(new, base, threshold):
+    """Print a comparison table, returns the names that regressed"""
+    bad = []
+    print '%-28s %12s %12s %8s' % ('benchmark (mean ms)', 'baseline', 'new', 'change')
+    for name in sorted(new['timings']):
+        n = new['timings'][name]['mean']
+        if not name in base['timings']:
+            print '%-28s %12s %12.3f %8s' % (name, '-', n, 'new')
+            continue
+        b = base['timings'][name]['mean']
+        change = (n-b)/b if b else 0.0
+        flag = ''
+        if change > threshold:
+            flag = ' <-- REGRESSION'
+            bad.append(name)
+        print '%-28s %12.3f %12.3f %+7.1f%%%s' % (name, b, n, change*100, flag)
+    return bad
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-o', '--output', help='write JSON results here')
+    parser.add_option('-c', '--compare', help='baseline JSON to compare with')
+    parser.add_option('-t', '--threshold', type='float', default=0.2,
+                      help='allowed slowdown before flagging (0.2 = 20%)')
+    parser.add_option('--games', type='int', default=3,
+                      help='CaughtByTheEnemy games to play')
+    parser.add_option('--width', type='int', default=128)
+    parser.add_option('--height', type='int', default=128)
+    parser.add_option('--units', type='int', default=500)
+    parser.add_option('--turns', type='int', default=3,
+                      help='rounds to play in the stress scenario')
+    parser.add_option('--sample', type='int', default=20,
+                      help='units to time abilities for')
+    parser.add_option('--seed', type='int', default=1)
+    parser.add_option('--skip-main', action='store_true', default=False)
+    parser.add_option('--skip-stress', action='store_true', default=False)
+    options, args = parser.parse_args()
+
+    new = run(options)
+
+    if options.output:
+        f = open(options.output, 'w')
+        json.dump(new, f, indent=2, sort_keys=True)
+        f.close()
+
+    if options.compare:
+        base = json.load(open(options.compare))
+        if compare(new, base, options.threshold):
+            sys.exit(1)
+    else:
+        for name in sorted(new['timings']):
+            t = new['timings'][name]
+            print '%-28s %5d runs  mean %10.3fms  max %10.3fms' % (name, t['runs'], t['mean'], t['max'])
+
+if __name__ == '__main__':
+    main()
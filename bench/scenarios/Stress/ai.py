@@ -0,0 +1,15 @@
+# The CaughtByTheEnemy AI, going for the nearest enemy instead of that
+# scenario's goals - loaded from there so the bench plays the real thing
+import os
+execfile(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data',
+                      'scenarios', 'CaughtByTheEnemy', 'ai.py'))
+
+class StressAI(store.ai):
+    def get_goals(self, unit):
+        return BaseAI.get_goals(self, unit)
+
+class StressSearchAI(BaseSearchAI, StressAI):
+    pass
+
+store.ai = StressAI
+store.search_ai = StressSearchAI
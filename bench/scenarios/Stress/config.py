@@ -0,0 +1,4 @@
+
+store.name = 'Stress'
+store.num_players = 2
+store.teams = ['red', 'blue']
@@ -0,0 +1,28 @@
+import random
+
+opts = gfx_engine.options
+width = opts.get('width', 128)
+height = opts.get('height', 128)
+walls = opts.get('walls', 0.1)
+rand = random.Random(opts.get('seed', 0))
+
+mapd = gfx_engine.mapd
+
+mapd.tiles = {0:'floor-dungeon-blue.png',
+              1:'floor-dungeon-blue.png'}
+
+#keep the spawn columns at both ends clear
+grid = []
+for y in xrange(height):
+    row = []
+    for x in xrange(width):
+        if 8 <= x < width-8 and rand.random() < walls:
+            row.append(1)
+        else:
+            row.append(0)
+    grid.append(row)
+mapd.map_grid = grid
+
+mapd.fill_entities(1, 'wall-dungeon-blue.png', 'blocking') #for the pathing
+
+mapd.engine.camera.set_pos(width/2, height/2)
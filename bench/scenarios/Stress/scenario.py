@@ -0,0 +1,34 @@
+
+class Scenario(BaseScenario):
+    def initialize(self):
+        opts = self.engine.engine.options
+        width = opts.get('width', 128)
+        height = opts.get('height', 128)
+        units = opts.get('units', 500)
+
+        # fill columns from each side of the map, alternating unit types
+        for i in xrange(units):
+            team = ('red', 'blue')[i%2]
+            n = i/2
+            x, y = n/height, n%height
+            if team == 'blue':
+                x = width-1-x
+            kind = ('fighter', 'archer')[(n/3)%2]
+            Unit(kind, team, ('%s%s'%(team, n), (x,y), 1))
+
+        self.max_turns = opts.get('turns', 5)
+        self.turn = 1
+
+    def on_turn_changed(self, team):
+        if team == 'red':
+            self.turn += 1
+
+    def winner(self):
+        if self.turn > self.max_turns:
+            return 'draw'
+        for team in ('red', 'blue'):
+            if not self.engine.table.count(team=team):
+                return ('blue', 'red')[team=='blue']
+        return None
+
+store.scenario = Scenario
@@ -41,6 +41,9 @@ class Ability(BaseAbility):
 
         return pos
 
+    def get_sim_spec(self):
+        return ('attack', self.range, 0.5, self.cost)
+
     def render_select(self):
         #TODO: add dodging of obstacles!
         mapd = self.unit.scenario.engine.gfx.mapd #yikes!
@@ -51,10 +54,7 @@ class Ability(BaseAbility):
 
         pos = self.get_select()
 
-        mapd.clear_highlights()
-        for i in set(pos):
-            if mapd.in_bounds(i):
-                mapd.add_highlight('gui_mouse-hover2.png', i)
+        mapd.set_highlights(pos, 'gui_mouse-hover2.png')
 
     def perform(self, target):
         units = self.unit.scenario.units
@@ -13,20 +13,11 @@ class Ability(BaseAbility):
         return target in self.get_select()
 
     def _get_blocked_tiles(self):
-        tiles = []
-        for i in self.unit.scenario.units:
-            if i.team != self.unit.team and i.dead == False:
-                tiles.append(i.pos)
+        table = self.unit.scenario.table
+        tiles = list(table.positions(enemy_of=self.unit.team))
+        tiles.extend(self.unit.scenario.engine.gfx.mapd.get_blocking_tiles())
 
-        for i in self.unit.scenario.engine.gfx.mapd.entities:
-            if i.name == 'blocking':
-                tiles.append(i.pos)
-
-        passable = []
-        for i in self.unit.scenario.units:
-            if i.team == self.unit.team and i.dead == False:
-                if not i in tiles:
-                    passable.append(i.pos)
+        passable = list(table.positions(team=self.unit.team))
 
         return tiles, passable
 
@@ -57,6 +48,9 @@ class Ability(BaseAbility):
 
         return pos
 
+    def get_sim_spec(self):
+        return ('move', 0, 0, 1)
+
     def render_select(self):
         #TODO: add dodging of obstacles!
         mapd = self.unit.scenario.engine.gfx.mapd #yikes!
@@ -67,10 +61,7 @@ class Ability(BaseAbility):
 
         pos = self.get_select()
 
-        mapd.clear_highlights()
-        for i in set(pos):
-            if mapd.in_bounds(i):
-                mapd.add_highlight('gui_mouse-hover2.png', i)
+        mapd.set_highlights(pos, 'gui_mouse-hover2.png')
 
     def perform(self, target):
         xx, xy = self.unit.pos
@@ -1,76 +1,76 @@
-
 class AI(BaseAI):
     def initialize(self):
         pass
 
-    def get_target(self, unit, enemy_list):
+    def get_goals(self, unit):
         ''' 'goodguys' target jail cell (14,16), then target map exit (0,0)
-            'badguys' target closest 'goodguy', and ignore the prisoner until
+            'badguys' target every 'goodguy', and ignore the prisoner until
             he is free.
         '''
-        goal = None
         if self.team == 'goodguys':
             if self.scenario.mod.prisoner_free:
-                goal = (0,0)
-            else:
-                goal = (16,14)
+                return [(0,0)]
+            return [(16,14)]
         elif self.team == 'badguys':
-            for i in enemy_list:
+            goals = []
+            for i in self.get_enemy_units():
                 if i.type == 'prisoner' and not self.scenario.mod.prisoner_free:
                     continue
-                if i.dead:
-                    continue
-                goal = i.pos
-                break
+                goals.append(i.pos)
+            return goals
         else:
             print('ai.py: team not in scenario')
-        return goal 
+        return []
 
-    def update(self):
-        enemy_list = self.get_enemy_units()
-        team_list = self.get_my_units()
-        if not (enemy_list or team_list):
-            self.end_my_turn()
-        for u in team_list:
-            if u.dead:
+    def try_attacks(self, unit):
+        enemies = self.get_enemy_tiles()
+        for a in unit.actions:
+            if a.name == 'Move':
+                continue # First try an attacking ability
+            if unit.cur_ap < a.cost:
                 continue
-            enemy_list.sort(key=lambda e: self.distance(e.pos,u.pos))
-            # AI always moves to the closest enemy.
-            while u.cur_ap > 0:
-                target = self.get_target(u, enemy_list)
+            # get_select once per ability, not once per enemy
+            for t in a.get_select():
+                if t in enemies:
+                    self.do_action(unit, a, t)
+                    enemies = self.get_enemy_tiles() #it may have died
+                    break
+
+    def update(self):
+        '''Generator - yields after each unit's action so the turn can be
+           spread across frames'''
+        self.begin_turn()
+        for u in self.get_my_units():
+            move = None
+            for a in u.actions:
+                if a.name == 'Move':
+                    move = a
+
+            while u.cur_ap > 0 and not u.dead:
+                field = self.get_distance_field(self.get_goals(u))
                 if u.name == 'Guard':
-                    if self.distance(target, u.pos) > 4:
+                    d = field.get(u.pos)
+                    if d is None or d > 4:
                         break
-                for a in u.actions:
-                    if a.name == 'Move':
-                        continue # First try an attacking ability
-                    for e in enemy_list:
-                        if a.test_acceptable(e.pos):
-                            self.do_action(u, a, e.pos)
 
-                # Now we make first attempt at moving.
-                if u.cur_ap < 1:
+                self.try_attacks(u)
+
+                # Move on the shared field - can't use the last AP moving
+                budget = u.cur_ap - 1
+                if budget < 1 or not move:
                     break
-                
-                #Refresh target, incase we killed some one.
-                target = self.get_target(u, enemy_list)
-                if not target:
+                tile = self.get_best_move(u, field, budget)
+                if not tile:
                     break
-                for a in u.actions:
-                    if a.name == 'Move':
-                        bt,pt = a._get_blocked_tiles()
-                        p = a.get_path(u.pos, target, bt+pt)
-                        tar = None
-                        if p:
-                            for i in p:
-                                if a.test_acceptable(i):
-                                    tar = i
-                                    break
-                        if tar:
-                            self.do_action(u, a, i)
-                        else:
-                            u.cur_ap = 0
-                        break
-        self.end_my_turn() 
+                self.do_action(u, move, tile)
+                yield None
+            yield None
+        self.end_my_turn()
+
+
+class SearchAI(BaseSearchAI, AI):
+    '''Same goals as AI, but plans the turn with a lookahead search'''
+    pass
 
 store.ai = AI
+store.search_ai = SearchAI
@@ -2,3 +2,4 @@
 store.name = 'CaughtByTheEnemy'
 store.num_players = 2
 store.teams = ['goodguys', 'badguys']
+store.search_ai = False #use the lookahead search AI for bots
@@ -27,15 +27,7 @@ mapd.map_grid = [[0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],
             [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,1],
             [0,0,0,0,0,0,0,0,1,1,1,1,1,1,1,1,1,1,1,1]]
 
-for y in xrange(20):
-    for x in xrange(20):
-        if mapd.map_grid[y][x] == 1:
-            mapd.make_entity('wall-dungeon-blue.png',
-                             (x,y),
-                             'blocking') #for the pathing
-        if mapd.map_grid[y][x] == 2:
-            mapd.make_entity('wall-bars-gate.png',
-                             (x,y),
-                             'Gate') #for the pathing
+mapd.fill_entities(1, 'wall-dungeon-blue.png', 'blocking') #for the pathing
+mapd.fill_entities(2, 'wall-bars-gate.png', 'Gate')
 
 mapd.engine.camera.set_pos(2.5, 1.5)
@@ -42,7 +42,7 @@ class Scenario(BaseScenario):
         self.last_turn = 'goodguys'
         self.label = gui.Label(self.engine.engine.app,
                                (500, 5),
-                               'Turn: 1/20')
+                               'Turn: 1/%s'%self.max_turns)
         self.label.text_color = (255,255,255)
 
         self.prisoner_free = False
@@ -51,27 +51,17 @@ class Scenario(BaseScenario):
         if self.turn > self.max_turns:
             return 'badguys'
 
-        fine = False
-        for i in self.engine.units:
-            if i.team == 'goodguys':
-                if i == self.prisoner:
-                    if self.prisoner_free:
-                        if i.dead == False:
-                            fine = True
-                            break
-                else:
-                    if i.dead == False:
-                        fine = True
-                        break
-
         if self.prisoner.dead: return 'badguys'
 
-        if not fine:
+        # a locked up prisoner can't win it for the goodguys
+        alive = self.engine.table.count(team='goodguys')
+        if not self.prisoner_free:
+            alive -= 1
+        if not alive:
             return 'badguys'
 
-        if self.prisoner.pos in [(0,0), (1,0), (2,0),
-                                 (0,1), (1,1), (2,1),
-                                 (0,2), (1,2), (2,2)]:
+        x, y = self.prisoner.pos
+        if x <= 2 and y <= 2: #the keep
             return 'goodguys'
         return None #none or team/player that won
 
@@ -82,11 +72,7 @@ class Scenario(BaseScenario):
                 self.at_start = False
 
     def get_goodguys(self):
-        ret = []
-        for i in self.engine.units:
-            if i.team == 'goodguys' and i.dead == False:
-                ret.append(i)
-        return ret
+        return self.engine.table.select(team='goodguys')
 
     def free_prisoner(self):
         self.engine.setScenarioMess('I am free! Now I must escape!', 'unit-test-prisoner.gif')
@@ -96,22 +82,23 @@ class Scenario(BaseScenario):
                 i.kill()
         self.prisoner.have_ability('move')
 
+    def on_turn_changed(self, team):
+        if not team == self.last_turn:
+            if team == 'goodguys':
+                self.turn += 1
+                self.label.text = 'Turn: %s/%s'%(self.turn, self.max_turns)
+            self.last_turn = team
+
+    def on_unit_moved(self, unit, old, new):
+        if not self.prisoner_free and unit.team == 'goodguys':
+            if not unit.type == 'prisoner':
+                if new in [(16,15), (16, 14), (16, 16)]:
+                    self.free_prisoner()
+
     def update(self):
         if self.at_start:
             mess, icon, butt, camera = self.start_messages[self.on_message]
             self.engine.setScenarioMess(mess, icon, butt)
             self.engine.engine.gfx.camera.pos = camera
-        whos_turn = self.engine.engine.engine.whos_turn #OMG yuck!
-        self.label.text = 'Turn: %s/30'%self.turn
-        if not whos_turn == self.last_turn:
-            if whos_turn == 'goodguys':
-                self.turn += 1
-            self.last_turn = whos_turn
-
-        if not self.prisoner_free:
-            for i in self.get_goodguys():
-                if not i.type == 'prisoner':
-                    if i.pos in [(16,15), (16, 14), (16, 16)]:
-                        self.free_prisoner()
 
 store.scenario = Scenario
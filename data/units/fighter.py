@@ -1,6 +1,7 @@
 
 
 class Unit(BaseUnit):
+    __slots__ = ()
     type = 'fighter'
     def initialize(self):
         self.strength = 10
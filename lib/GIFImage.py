@@ -4,25 +4,58 @@ import Image
 import pygame
 from pygame.locals import *
 
+from engine import gif_cache, misc
+
 import time
+from bisect import bisect_right
+
+clock = misc.anim_clock #one clock for these and the engine's animations
 
 class GIFImage(object):
     def __init__(self, filename):
         self.filename = filename
-        self.image = Image.open(filename)
-        self.frames = []
-        self.get_frames()
+        self.frames = gif_cache.load(filename)
+        if self.frames is None:
+            self.image = Image.open(filename)
+            self.frames = []
+            self.get_frames()
+            gif_cache.save(filename, self.frames)
+        self.size = self.frames[0][0].get_size()
 
         self.cur = 0
-        self.ptime = time.time()
+        self.ptime = clock.now #when the current loop started
 
         self.running = True
         self.breakpoint = len(self.frames)-1
         self.startpoint = 0
         self.reversed = False
+        self._build_times()
+
+    def _build_times(self):
+        """Frames played, in order, and when each one ends in the loop"""
+        self.order = range(self.startpoint, self.breakpoint+1)
+        if self.reversed:
+            self.order.reverse()
+        self.cum_durations = []
+        t = 0
+        for i in self.order:
+            t += self.frames[i][1]
+            self.cum_durations.append(t)
+        self._sync()
+
+    def _sync(self):
+        """Line the loop up so the current frame starts now"""
+        if self.cur in self.order:
+            n = self.order.index(self.cur)
+        else:
+            n = 0
+        if n:
+            self.ptime = clock.now - self.cum_durations[n-1]
+        else:
+            self.ptime = clock.now
 
     def get_rect(self):
-        return pygame.rect.Rect((0,0), self.image.size)
+        return pygame.rect.Rect((0,0), self.size)
 
     def get_frames(self):
         image = self.image
@@ -99,21 +132,16 @@ class GIFImage(object):
         except EOFError:
             pass
 
-    def render(self, screen, pos):
-        if self.running:
-            if time.time() - self.ptime > self.frames[self.cur][1]:
-                if self.reversed:
-                    self.cur -= 1
-                    if self.cur < self.startpoint:
-                        self.cur = self.breakpoint
-                else:
-                    self.cur += 1
-                    if self.cur > self.breakpoint:
-                        self.cur = self.startpoint
-
-                self.ptime = time.time()
+    def get_frame(self):
+        """Index of the frame showing now"""
+        if self.running and self.cum_durations and self.cum_durations[-1] > 0:
+            t = (clock.now - self.ptime) % self.cum_durations[-1]
+            n = min(bisect_right(self.cum_durations, t), len(self.order)-1)
+            self.cur = self.order[n]
+        return self.cur
 
-        screen.blit(self.frames[self.cur][0], pos)
+    def render(self, screen, pos):
+        screen.blit(self.frames[self.get_frame()][0], pos)
 
     def seek(self, num):
         self.cur = num
@@ -121,6 +149,7 @@ class GIFImage(object):
             self.cur = 0
         if self.cur >= len(self.frames):
             self.cur = len(self.frames)-1
+        self._sync()
 
     def set_bounds(self, start, end):
         if start < 0:
@@ -135,12 +164,14 @@ class GIFImage(object):
             end = start
         self.startpoint = start
         self.breakpoint = end
+        self._build_times()
 
     def pause(self):
         self.running = False
 
     def play(self):
         self.running = True
+        self._sync()
 
     def rewind(self):
         self.seek(0)
@@ -148,19 +179,20 @@ class GIFImage(object):
         self.seek(self.length()-1)
 
     def get_height(self):
-        return self.image.size[1]
+        return self.size[1]
     def get_width(self):
-        return self.image.size[0]
+        return self.size[0]
     def get_size(self):
-        return self.image.size
+        return self.size
     def length(self):
         return len(self.frames)
     def reverse(self):
         self.reversed = not self.reversed
+        self._build_times()
     def reset(self):
         self.cur = 0
-        self.ptime = time.time()
         self.reversed = False
+        self._build_times()
 
     def copy(self):
         new = GIFImage(self.filename)
@@ -168,8 +200,9 @@ class GIFImage(object):
         new.breakpoint = self.breakpoint
         new.startpoint = self.startpoint
         new.cur = self.cur
-        new.ptime = self.ptime
         new.reversed = self.reversed
+        new._build_times()
+        new.ptime = self.ptime
         return new
 
 ##def main():
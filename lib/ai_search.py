@@ -0,0 +1,333 @@
+"""Lookahead search for the AI.
+
+The real Unit/Ability objects are tied to the scenario and gfx engine, so
+the search runs on a SimState - a small copyable (and picklable) snapshot
+of the battle. Abilities describe themselves to the simulation through
+Ability.get_sim_spec, see mod_base.
+
+Candidate first moves are searched in parallel on a multiprocessing pool
+(when available), each worker runs a beam search until a deadline a bit
+before the turn's, so results are back in time. Without a pool the beam
+search runs in process, a slice of time per frame."""
+
+import time
+import pathing
+
+try:
+    import multiprocessing
+    MP_AVAILABLE = True
+except:
+    MP_AVAILABLE = False
+
+class SimState(object):
+    """Snapshot of every unit on the map.
+       Per unit lists are indexed the same way:
+           gids, teams, pos, hp, ap, strength, specs
+       specs is a tuple of (action_index, spec) for each simulated ability"""
+    def __init__(self, size, walls, goals):
+        self.size = size
+        self.walls = frozenset(walls)
+        self.goals = goals #{team:[tiles]}
+
+        self.gids = []
+        self.teams = []
+        self.strength = []
+        self.specs = []
+
+        self.pos = []
+        self.hp = []
+        self.ap = []
+
+    def add_unit(self, gid, team, pos, hp, ap, strength, specs):
+        self.gids.append(gid)
+        self.teams.append(team)
+        self.pos.append(pos)
+        self.hp.append(hp)
+        self.ap.append(ap)
+        self.strength.append(strength)
+        self.specs.append(tuple(specs))
+
+    def copy(self):
+        """Copy only the parts that actions change"""
+        new = SimState.__new__(SimState)
+        new.size = self.size
+        new.walls = self.walls
+        new.goals = self.goals
+        new.gids = self.gids
+        new.teams = self.teams
+        new.strength = self.strength
+        new.specs = self.specs
+
+        new.pos = list(self.pos)
+        new.hp = list(self.hp)
+        new.ap = list(self.ap)
+        return new
+
+    def alive(self, i):
+        return self.hp[i] > 0
+
+    def units_of(self, team):
+        return [i for i in xrange(len(self.gids))
+                if self.teams[i] == team and self.hp[i] > 0]
+
+    def enemies_of(self, team):
+        return [i for i in xrange(len(self.gids))
+                if self.teams[i] != team and self.hp[i] > 0]
+
+def get_unit_actions(state, i, field, max_moves):
+    """Return every (action_index, target) the unit can do right now.
+       Moves are cut down to the max_moves ones closest to our goals."""
+    team = state.teams[i]
+    x, y = state.pos[i]
+    ap = state.ap[i]
+    acts = []
+    enemies = state.enemies_of(team)
+    for index, spec in state.specs[i]:
+        kind, reach, damage, cost = spec
+        if kind == 'attack':
+            if ap < 1 or (cost and ap < cost):
+                continue
+            for e in enemies:
+                ex, ey = state.pos[e]
+                if 0 < max(abs(ex-x), abs(ey-y)) <= reach:
+                    acts.append((index, (ex, ey)))
+        elif kind == 'move':
+            if ap < 2: #can't be last action!
+                continue
+            blocked = set(state.walls)
+            for e in enemies:
+                blocked.add(state.pos[e])
+            friends = [state.pos[f] for f in state.units_of(team) if f != i]
+            w, h = state.size
+            tiles = pathing.reachable_tiles((x,y), ap-1, w, h, blocked, friends)
+            tiles = tiles.keys()
+            tiles.sort(key=lambda t: field.get(t, w*h))
+            for t in tiles[:max_moves]:
+                acts.append((index, t))
+    return acts
+
+def apply_action(state, i, action):
+    """Perform action for unit i on state (in place)"""
+    index, target = action
+    for n, spec in state.specs[i]:
+        if n == index:
+            break
+    kind, reach, damage, cost = spec
+    if kind == 'move':
+        x, y = state.pos[i]
+        state.ap[i] -= abs(target[0]-x) + abs(target[1]-y)
+        state.pos[i] = target
+    elif kind == 'attack':
+        for e in state.enemies_of(state.teams[i]):
+            if state.pos[e] == target:
+                state.hp[e] = max(0, state.hp[e] - int(state.strength[i]*damage))
+        if cost:
+            state.ap[i] -= cost
+        else:
+            state.ap[i] = 0
+
+def evaluate(state, team, field):
+    """Score state for team - higher is better"""
+    w, h = state.size
+    score = 0.0
+    for i in xrange(len(state.gids)):
+        if state.teams[i] == team:
+            if state.hp[i] > 0:
+                score += state.hp[i]
+                score -= 0.5 * field.get(state.pos[i], w+h)
+            else:
+                score -= 10
+        else:
+            if state.hp[i] > 0:
+                score -= state.hp[i]
+            else:
+                score += 10
+    return score
+
+def get_field(state, team):
+    w, h = state.size
+    blocked = set(state.walls)
+    for e in state.enemies_of(team):
+        blocked.add(state.pos[e])
+    return pathing.DistanceField(w, h, state.goals.get(team, ()), blocked)
+
+def expand_unit(state, i, field, max_moves):
+    """Return (state, line) for every plan unit i can make this turn:
+       attack, move then attack, or move - and doing nothing."""
+    plans = [(state, [])]
+    first = get_unit_actions(state, i, field, max_moves)
+    for act in first:
+        s1 = state.copy()
+        apply_action(s1, i, act)
+        plans.append((s1, [(i, act)]))
+        for act2 in get_unit_actions(s1, i, field, 1):
+            s2 = s1.copy()
+            apply_action(s2, i, act2)
+            plans.append((s2, [(i, act), (i, act2)]))
+    return plans
+
+class BeamSearch(object):
+    """Plan the units in order one at a time, keeping the beam_width best
+       partial turns. The work is done by step() in slices, one beam entry
+       at a time, so it can be spread over frames."""
+    def __init__(self, state, team, order, line=(), beam_width=8, max_moves=6):
+        self.team = team
+        self.order = list(order)
+        self.beam_width = beam_width
+        self.max_moves = max_moves
+
+        self.field = get_field(state, team)
+        self.beam = [(evaluate(state, team, self.field), state, list(line))]
+        self.new = []
+        self.unit = 0 #index into order of the unit being planned
+        self.entry = 0 #index into beam of the next entry to expand
+
+    def is_done(self):
+        return self.unit >= len(self.order)
+
+    def step(self, until):
+        """Search until time until (or the end), returns True when done"""
+        while not self.is_done():
+            i = self.order[self.unit]
+            score, s, l = self.beam[self.entry]
+            if s.alive(i):
+                for s2, acts in expand_unit(s, i, self.field, self.max_moves):
+                    self.new.append((evaluate(s2, self.team, self.field),
+                                     s2, l+acts))
+            else:
+                self.new.append((score, s, l))
+
+            self.entry += 1
+            if self.entry >= len(self.beam):
+                self.new.sort(key=lambda x: x[0], reverse=True)
+                self.beam = self.new[:self.beam_width]
+                self.new = []
+                self.entry = 0
+                self.unit += 1
+            if time.time() >= until:
+                break
+        return self.is_done()
+
+    def get_best(self):
+        """Return (score, line) of the best (partial) turn so far"""
+        best = max(self.beam + self.new, key=lambda x: x[0])
+        return best[0], best[2]
+
+def beam_search(state, team, order, line, deadline, beam_width=8, max_moves=6):
+    """Returns (score, line) of the best turn found before deadline,
+       see BeamSearch."""
+    search = BeamSearch(state, team, order, line, beam_width, max_moves)
+    search.step(deadline)
+    return search.get_best()
+
+def _search_worker(args):
+    state, team, order, line, deadline, beam_width, max_moves = args
+    return beam_search(state, team, order, line, deadline, beam_width, max_moves)
+
+_pool = None
+def get_pool():
+    """Return the shared worker pool, one process per core - or None"""
+    global _pool
+    if _pool is None and MP_AVAILABLE:
+        try:
+            _pool = multiprocessing.Pool(multiprocessing.cpu_count())
+        except:
+            _pool = False
+    return _pool or None
+
+def close_pool():
+    global _pool
+    if _pool:
+        _pool.terminate()
+    _pool = None
+
+class Search(object):
+    """One turn of search for team, run until deadline.
+       Call step() until it returns True, then read line - each call
+       works for at most step_time seconds.
+
+       Pool workers stop at worker_share of the time limit, and at least
+       finish_wait before the deadline - that last stretch is kept for
+       their results to come back, so finish() never waits past the
+       deadline. line always holds a move: when nothing came back it is
+       the best plan for the first unit."""
+    step_time = 0.005
+    worker_share = 0.8
+    finish_wait = 0.05
+
+    def __init__(self, state, team, time_limit, beam_width=8, max_moves=6,
+                 use_pool=True):
+        self.state = state
+        self.team = team
+        start = time.time()
+        self.deadline = start + time_limit
+        self.beam_width = beam_width
+        self.max_moves = max_moves
+
+        self.best = None
+        self.line = []
+
+        order = state.units_of(team)
+        self.pool = None
+        self.local = None
+        self.pending = []
+        if not order:
+            return
+
+        self.pool = use_pool and get_pool()
+        if self.pool:
+            worker_deadline = min(start + time_limit*self.worker_share,
+                                  self.deadline - self.finish_wait)
+            field = get_field(state, team)
+            first, rest = order[0], order[1:]
+            for s, acts in expand_unit(state, first, field, max_moves):
+                #a plan for the first unit is better than nothing
+                self.add_result((evaluate(s, team, field), acts))
+                job = (s, team, rest, acts, worker_deadline,
+                       beam_width, max_moves)
+                self.pending.append(self.pool.apply_async(_search_worker,
+                                                          (job,)))
+        else:
+            self.local = BeamSearch(state, team, order, (),
+                                    beam_width, max_moves)
+
+    def add_result(self, result):
+        if self.best is None or result[0] > self.best:
+            self.best, self.line = result
+
+    def step(self):
+        """Do a slice of work, returns True when the search is over"""
+        now = time.time()
+        if now >= self.deadline or (self.pending and
+                                    now >= self.deadline - self.finish_wait):
+            self.finish()
+            return True
+
+        if self.local:
+            until = min(self.deadline, time.time() + self.step_time)
+            if self.local.step(until):
+                self.finish()
+                return True
+            return False
+
+        for i in list(self.pending):
+            if i.ready():
+                self.pending.remove(i)
+                if i.successful():
+                    self.add_result(i.get())
+        return not self.pending
+
+    def finish(self):
+        """Deadline hit - keep the best line found so far"""
+        if self.local:
+            if not self.local.unit:
+                self.local.step(0) #plan the first unit at least
+            self.add_result(self.local.get_best())
+            self.local = None
+
+        for i in self.pending:
+            try:
+                self.add_result(i.get(max(0, self.deadline - time.time())))
+            except:
+                pass #timed out or failed - the partial line will do
+        self.pending = []
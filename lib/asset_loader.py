@@ -0,0 +1,125 @@
+"""Load assets on background threads while the game keeps drawing.
+
+Files are decoded by worker threads, the part that must happen on the
+main (display/GL) thread - converting surfaces, uploading textures - runs
+in update(), a little every frame within a time budget. Work that can't
+be threaded at all, like building the map, is queued as steps:
+
+    loader = AssetLoader()
+    loader.add('a.png', pygame.image.load, store_image)
+    loader.add_step(load_map)
+    loader.on_done(set_flags)
+    ...
+    while not loader.finished: #each frame
+        loader.update(0.01)
+        draw_loading_screen(loader.get_progress())"""
+
+import threading, Queue, time, traceback
+
+class AssetLoader(object):
+    def __init__(self, workers=2):
+        self.jobs = Queue.Queue()
+        self.results = Queue.Queue()
+        self.total = 0
+        self.done = 0
+        self.failed = []
+        self.done_funcs = []
+        self.steps = []
+        self.loading = 0 #files queued on the threads, not finished yet
+        self.finished = True
+
+        self.threads = []
+        for i in xrange(workers):
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            path, decode, finish = job
+            try:
+                self.results.put((path, decode(path), finish, None))
+            except:
+                self.results.put((path, None, finish, traceback.format_exc()))
+
+    def add(self, path, decode, finish):
+        """Queue path - decode(path) runs on a worker thread, then
+           finish(path, data) on the main thread in update"""
+        self.total += 1
+        self.loading += 1
+        self.finished = False
+        self.jobs.put((path, decode, finish))
+
+    def add_step(self, func):
+        """Queue func() to run on the main thread in update, once no files
+           are loading. Steps run in order and count towards the progress,
+           so the loading screen keeps drawing between them"""
+        self.total += 1
+        self.finished = False
+        self.steps.append(func)
+
+    def on_done(self, func):
+        """Call func() on the main thread once everything queued is loaded"""
+        self.done_funcs.append(func)
+
+    def update(self, budget=0.01):
+        """Finish decoded assets and run steps for up to budget seconds,
+           returns True once everything is loaded"""
+        end = time.time() + budget
+        while self.done < self.total:
+            if self.steps and not self.loading:
+                self.steps.pop(0)()
+            else:
+                try:
+                    path, data, finish, error = self.results.get_nowait()
+                except Queue.Empty:
+                    break
+                self.loading -= 1
+                if error:
+                    print 'failed to load <%s>'%path
+                    print error
+                    self.failed.append(path)
+                else:
+                    finish(path, data)
+            self.done += 1
+            if time.time() >= end:
+                break
+
+        self.finished = self.done == self.total
+        if self.finished and self.done_funcs:
+            #also when nothing was queued at all
+            funcs = self.done_funcs
+            self.done_funcs = []
+            for i in funcs:
+                i()
+        return self.finished
+
+    def wait(self):
+        """Block until everything is loaded"""
+        while not self.update(1):
+            time.sleep(0.001)
+
+    def get_progress(self):
+        """Return (done, total)"""
+        return self.done, self.total
+
+    def cancel(self):
+        """Drop everything not loaded yet and stop the threads - files
+           being decoded right now are thrown away"""
+        try:
+            while True:
+                self.jobs.get_nowait()
+        except Queue.Empty:
+            pass
+        self.steps = []
+        self.done_funcs = []
+        self.close()
+
+    def close(self):
+        for i in self.threads:
+            self.jobs.put(None)
+        self.threads = []
@@ -0,0 +1,137 @@
+"""Chunked storage for big tile maps.
+
+The map is cut into square chunks (16x16 tiles by default), each with its
+own tile array, entity list, blocking tiles and a dirty flag - so drawing,
+path finding and occupancy queries only touch the chunks they need.
+
+Chunk entity lists are kept in draw order - back to front, by (y, -x) -
+so nothing has to be sorted when rendering, see ChunkedMap.draw_order."""
+
+from array import array
+from bisect import bisect, bisect_left
+from itertools import izip
+import heapq
+
+CHUNK_SIZE = 16
+
+class Chunk(object):
+    def __init__(self, cx, cy, size):
+        self.cx = cx
+        self.cy = cy
+        self.size = size
+        self.tiles = array('h', [0]) * (size*size)
+        self.entities = [] #in draw order
+        self.keys = [] #draw key of each entity, for bisect
+        self.blocking = {} #tile:number of blocking entities on it
+
+        self.dirty = True #tiles changed since last cached for rendering
+
+    def get_area(self):
+        """Tile area covered, as (x0, y0, x1, y1) - x1/y1 exclusive"""
+        s = self.size
+        return (self.cx*s, self.cy*s, self.cx*s+s, self.cy*s+s)
+
+class ChunkedMap(object):
+    def __init__(self, width, height, chunk_size=CHUNK_SIZE):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+
+        self.chunks_x = (width + chunk_size - 1) / chunk_size
+        self.chunks_y = (height + chunk_size - 1) / chunk_size
+        self.chunks = []
+        for cy in xrange(self.chunks_y):
+            for cx in xrange(self.chunks_x):
+                self.chunks.append(Chunk(cx, cy, chunk_size))
+
+        self.blocking = set() #every tile with a blocking entity
+        self.next_seq = 0 #keeps draw keys unique
+
+    def load_grid(self, grid):
+        """Fill tiles from a list of rows"""
+        s = self.chunk_size
+        for y, row in enumerate(grid):
+            for x, val in enumerate(row):
+                c = self.chunks[(y/s)*self.chunks_x + x/s]
+                c.tiles[(y%s)*s + x%s] = val
+        for c in self.chunks:
+            c.dirty = True
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def get_chunk(self, x, y):
+        s = self.chunk_size
+        return self.chunks[(int(y)/s)*self.chunks_x + int(x)/s]
+
+    def get_tile(self, x, y):
+        s = self.chunk_size
+        return self.get_chunk(x, y).tiles[(y%s)*s + x%s]
+
+    def set_tile(self, x, y, val):
+        s = self.chunk_size
+        c = self.get_chunk(x, y)
+        c.tiles[(y%s)*s + x%s] = val
+        c.dirty = True
+
+    def get_chunks_in(self, area):
+        """Return every chunk overlapping the tile area (x0, y0, x1, y1),
+           x1/y1 inclusive"""
+        x0, y0, x1, y1 = area
+        s = self.chunk_size
+        cx0 = max(0, int(x0)/s)
+        cy0 = max(0, int(y0)/s)
+        cx1 = min(self.chunks_x-1, int(x1)/s)
+        cy1 = min(self.chunks_y-1, int(y1)/s)
+        ret = []
+        for cy in xrange(cy0, cy1+1):
+            for cx in xrange(cx0, cx1+1):
+                ret.append(self.chunks[cy*self.chunks_x + cx])
+        return ret
+
+    # Entity bookkeeping - entities tell us when they enter/leave a tile,
+    # or move at all, as that changes their draw order
+    def add_entity(self, ent, tile):
+        if not self.in_bounds(tile):
+            return
+        c = self.get_chunk(*tile)
+        x, y = ent.pos
+        ent.draw_key = (y, -x, self.next_seq)
+        self.next_seq += 1
+        i = bisect(c.keys, ent.draw_key)
+        c.keys.insert(i, ent.draw_key)
+        c.entities.insert(i, ent)
+        if ent.name == 'blocking':
+            c.blocking[tile] = c.blocking.get(tile, 0) + 1
+            self.blocking.add(tile)
+
+    def remove_entity(self, ent, tile):
+        if not self.in_bounds(tile):
+            return
+        c = self.get_chunk(*tile)
+        i = bisect_left(c.keys, ent.draw_key)
+        if i < len(c.keys) and c.entities[i] is ent:
+            del c.keys[i]
+            del c.entities[i]
+            if ent.name == 'blocking':
+                c.blocking[tile] -= 1
+                if not c.blocking[tile]:
+                    del c.blocking[tile]
+                    self.blocking.discard(tile)
+
+    def get_entities_on_tile(self, x, y):
+        if not self.in_bounds((x, y)):
+            return []
+        return [i for i in self.get_chunk(x, y).entities
+                if i.get_my_tile() == (x, y)]
+
+    def get_entities_in(self, area):
+        ret = []
+        for c in self.get_chunks_in(area):
+            ret.extend(c.entities)
+        return ret
+
+    def draw_order(self, chunks):
+        """Iterate the entities of chunks back to front"""
+        for key, ent in heapq.merge(*[izip(c.keys, c.entities) for c in chunks]):
+            yield ent
@@ -2,8 +2,9 @@
 ##from pygame.locals import *
 import engine
 from engine import *
-import SLG, event, gui, load_mod_file, in_game
-import glob, os
+import SLG, event, gui, load_mod_file, in_game, ai_search
+from profiler import profiler
+import glob, os, time
 
 
 class Main(SLG.Client):
@@ -23,6 +24,7 @@ class Main(SLG.Client):
                             SLG.main_server_port)
 
     def close_app(self):
+        ai_search.close_pool()
         self.screen.destroy()
         self.disconnect()
         self.close()
@@ -52,30 +54,40 @@ class Main(SLG.Client):
         raw_input('Connection to server lost!')
 
     def update(self):
+        profiler.begin_frame()
+        profiler.begin('wait')
         self.clock.tick(30)
+        profiler.end('wait')
         self.screen.set_caption(str(self.clock.get_fps()))
 
         self.cur_state.update()
+        profiler.end_frame()
 
     def remote_getMessage(self, player, message):
         self.cur_state.remote_getMessage(player, message)
+        self.cur_state.redraw = True
 
     def sendMessage(self, message):
         self.avatar.callRemote('sendMessage', message)
 
     def remote_sendGameList(self, games):
         self.cur_state.remote_sendGameList(games)
+        self.cur_state.redraw = True
 
     def remote_sendLobbyUsersList(self, users):
         self.cur_state.remote_sendLobbyUsersList(users)
+        self.cur_state.redraw = True
 
     def remote_cannotJoinGame(self, reason):
         self.cur_state.remote_cannotJoinGame(reason)
+        self.cur_state.redraw = True
 
     def remote_getTalkFromServer(self, command, args):
         self.cur_state.remote_getTalkFromServer(command, args)
+        self.cur_state.redraw = True
 
 class State(object):
+    idle_redraw = 0.25 #seconds between redraws when nothing happens
     def __init__(self, engine):
         self.engine = engine
         self.screen = self.engine.screen
@@ -85,18 +97,35 @@ class State(object):
         #App grabs the active screen - there can only be one...
         self.app = gui.App(self.event_handler)
 
+        self.redraw = True #something changed, draw next update
+        self.last_redraw = 0
+
     def update(self):
+        profiler.begin('events')
         self.event_handler.update()
+        profiler.end('events')
 
         if self.event_handler.quit:
             self.engine.close_app()
             return None
 
+        #nothing to show for it - don't draw the same frame again
+        now = time.time()
+        if self.app.get_dirty_rects() == [] and not \
+               (self.redraw or now - self.last_redraw > self.idle_redraw):
+            return None
+        self.redraw = False
+        self.last_redraw = now
+
         #change view to 2d here - will have to remember to change to 3d in game!
         self.screen.clear()
         self.screen.set_2d(); self.screen.set_lighting(False)
+        profiler.begin('gui')
         self.app.render()
+        profiler.end('gui')
+        profiler.begin('flip')
         self.screen.refresh()
+        profiler.end('flip')
 
     def remote_getMessage(self, player, message):
         pass
@@ -175,23 +204,23 @@ class Connect(State):
     def handle_server_sel(self, value):
         if value == 'main':
             self.connect_server_serv.text = SLG.main_server_host
-            self.connect_server_serv.theme.set_val('visible', False)
+            self.connect_server_serv.set_visible(False)
         elif value == 'local':
             self.connect_server_serv.text = 'localhost'
-            self.connect_server_serv.theme.set_val('visible', False)
+            self.connect_server_serv.set_visible(False)
         elif value == 'other':
             self.connect_server_serv.text = SLG.main_server_host
-            self.connect_server_serv.theme.set_val('visible', True)
+            self.connect_server_serv.set_visible(True)
             self.connect_server_serv.cursor_pos = len(SLG.main_server_host)
         self.connect_server_drop.text = value
 
     def handle_port_sel(self, value):
         if value == 'default':
             self.connect_port_serv.text = str(SLG.main_server_port)
-            self.connect_port_serv.theme.set_val('visible', False)
+            self.connect_port_serv.set_visible(False)
         elif value == 'other':
             self.connect_port_serv.text = str(SLG.main_server_port)
-            self.connect_port_serv.theme.set_val('visible', True)
+            self.connect_port_serv.set_visible(True)
             self.connect_port_serv.cursor_pos = len(SLG.main_server_host)
         self.connect_port_drop.text = value
 
@@ -501,6 +530,9 @@ class GameRoomLobby(State):
 
     def update(self):
         if self.cur_game.in_game:
+            if self.redraw:
+                self.cur_game.game_obj.redraw()
+                self.redraw = False
             self.cur_game.update_game()
         else:
             State.update(self)
@@ -544,7 +576,7 @@ class GameEngine(object):
         if self.in_game:
             self.game_obj.messages.add_line('<server>: You [%s] are now master'%self.client.engine.username)
         for i in self.free_teams:
-            self.game_obj.mod.make_ai_player(i)
+            self.game_obj.make_ai_player(i)
 
     def kickedDueToTooManyPlayers(self, args):
         self.client.engine.cur_state = MidGameLeave(self.client.engine, #YUCK!
@@ -603,7 +635,11 @@ class GameEngine(object):
         self.talkToServer('kickPlayer', name)
 
     def getTalkFromServer(self, command, args):
-        getattr(self, command)(args)
+        if self.in_game:
+            #the game may still be loading its scenario
+            self.game_obj.when_loaded(getattr(self, command), args)
+        else:
+            getattr(self, command)(args)
 
     def sendMessage(self, message):
         self.talkToServer('player_message', message)
@@ -623,7 +659,7 @@ class GameEngine(object):
         self.in_game = True
         if self.am_master:
             for i in self.free_teams:
-                self.game_obj.mod.make_ai_player(i)
+                self.game_obj.make_ai_player(i)
 
     def masterStartGame(self):
         self.talkToServer('masterStartGame', None)
@@ -640,18 +676,10 @@ class GameEngine(object):
         av_name, args = args
         gid, action, xy = args
 
-
-        unit = None
-        for i in self.game_obj.mod.units:
-            if i.gid == gid:
-                unit = i
-                break
-
+        unit = self.game_obj.mod.get_unit(gid)
         act = None
-        for i in unit.actions:
-            if i.name == action:
-                act = i
-                break
+        if unit:
+            act = unit.get_action(action)
 
         if unit and act and (not unit.dead):
             player = None
@@ -1,4 +1,4 @@
-import animated_texture, display, draw, font, helpers
-import image, include, misc, storage, texture
+import animated_texture, atlas, batch, display, draw, font, helpers
+import image, include, misc, state, storage, texture
 
 from include import *
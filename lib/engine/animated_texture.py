@@ -2,14 +2,33 @@ import include
 from include import *
 
 import display
+import gif_cache
+import misc
 import texture
 
+from bisect import bisect_right
+import functools, weakref
+
+def reload_frame(ref, index):
+    """Surface of frame index of the animated Texture ref points to.
+       The gif is decoded once and every other unloaded frame is reloaded
+       from it too, instead of decoding the whole file per frame"""
+    anim = ref()
+    frames = GIFImage(anim.filename).frames
+    for i, tex in enumerate(anim.textures):
+        if i != index and not tex.is_resident():
+            tex._from_image(frames[i][0])
+    return frames[index][0]
+
 class GIFImage(object):
     def __init__(self, filename):
         self.filename = filename
-        self.image = PIL.open(filename)
-        self.frames = []
-        self.get_frames()
+        self.frames = gif_cache.load(filename)
+        if self.frames is None:
+            self.image = PIL.open(filename)
+            self.frames = []
+            self.get_frames()
+            gif_cache.save(filename, self.frames)
 
         self.cur = 0
         self.ptime = time.time()
@@ -91,6 +110,7 @@ class GIFImage(object):
 
 class Texture(object):
     def __init__(self):
+        self.filename = None
         self.textures = []
         self.durations = []
         self.size = (0,0)
@@ -99,8 +119,10 @@ class Texture(object):
 
         self.repeat = False
 
-        self.ptime = time.time()
-        self.cur_frame = 0
+        self.start = misc.anim_clock.now
+        self.cum_durations = [] #when each frame ends, from start
+        self._frame = 0
+        self._frame_at = -1 #clock frame _frame was worked out on
 
     def _from_file(self, filename):
         self._from_image(GIFImage(filename))
@@ -113,29 +135,45 @@ class Texture(object):
             i.free_texture()
         self.textures = []
         self.durations = []
+        self.cum_durations = []
 
     def _compile(self, image):
+        self.filename = image.filename
         self.textures = []
         self.durations = []
-        for frame in image.frames:
+        self.cum_durations = []
+        total = 0
+        ref = weakref.ref(self) #frames keeping self alive would be a cycle
+        for i, frame in enumerate(image.frames):
             frame, dur = frame
             self.durations.append(dur)
-            image = texture.Texture()
-            image._from_image(frame)
-            self.textures.append(image)
+            total += dur
+            self.cum_durations.append(total)
+            tex = texture.Texture()
+            tex.name = '%s[%s]'%(image.filename, i)
+            tex.source = functools.partial(reload_frame, ref, i)
+            tex._from_image(frame)
+            self.textures.append(tex)
         self.size = self.textures[0].size
         self.size_mult = self.textures[0].size_mult
         self.area = self.textures[0].area
 
-    def bind(self):
-        if time.time() - self.ptime > self.durations[self.cur_frame]:
-            self.cur_frame += 1
-            if self.cur_frame >= len(self.textures):
-                self.cur_frame = 0
+    def get_frame(self):
+        """Frame to show now - worked out once per clock tick and shared
+           by every clone and region of this texture"""
+        clock = misc.anim_clock
+        if self._frame_at != clock.frame:
+            self._frame_at = clock.frame
+            total = self.cum_durations[-1] if self.cum_durations else 0
+            if total > 0:
+                t = (clock.now - self.start) % total
+                self._frame = min(bisect_right(self.cum_durations, t),
+                                  len(self.textures)-1)
+        return self._frame
+    cur_frame = property(get_frame)
 
-            self.ptime = time.time()
-
-        self.textures[self.cur_frame].bind()
+    def bind(self):
+        self.textures[self.get_frame()].bind()
 
     def bind_orepeat(self, repeat):
         self.textures[self.cur_frame].bind_orepeat(repeat)
@@ -160,23 +198,15 @@ class TextureClone(texture.TextureClone):
         self.area = self.tex.area
         self.repeat = False
 
-        self.ptime = time.time()
-        self.cur_frame = 0
+    def get_frame(self):
+        return self.tex.get_frame()
+    cur_frame = property(get_frame)
 
     def bind(self):
-        self.check_swap()
-        self.tex.bind_frame(self.cur_frame)
-
-    def check_swap(self):
-        if time.time() - self.ptime > self.tex.durations[self.cur_frame]:
-            self.cur_frame += 1
-            if self.cur_frame >= len(self.tex.textures):
-                self.cur_frame = 0
-
-            self.ptime = time.time()
+        self.tex.bind_frame(self.tex.get_frame())
 
     def get_region(self, area):
-        return self.tex.get_region(self, clamp_area(self.area, area))
+        return self.tex.get_region(area)
 
 class TextureRegion(object):
     def __init__(self, tex, area):
@@ -191,18 +221,12 @@ class TextureRegion(object):
         y = self.area[3] - self.area[1]
         self.size = x, y
 
-        self.ptime = time.time()
-        self.cur_frame = 0
+    def get_frame(self):
+        return self.tex.get_frame()
+    cur_frame = property(get_frame)
 
     def bind(self):
-        if time.time() - self.ptime > self.tex.durations[self.cur_frame]:
-            self.cur_frame += 1
-            if self.cur_frame >= len(self.tex.textures):
-                self.cur_frame = 0
-
-            self.ptime = time.time()
-
-        self.textures[self.cur_frame].bind_orepeat(False)
+        self.textures[self.get_frame()].bind_orepeat(False)
 
     def coord(self, x, y):
         x1,y1,x2,y2 = self.area
@@ -215,4 +239,5 @@ class TextureRegion(object):
         return self.tex.coord(x,y)
 
     def get_region(self, area):
-        return TextureRegion(self, clamp_area(self.area, area))
+        """See texture.TextureRegion.get_region"""
+        return TextureRegion(self.tex, offset_area(self.area, area))
@@ -0,0 +1,124 @@
+import include
+from include import *
+
+import display
+import texture
+
+class AtlasPage(object):
+    """One atlas texture, filled a shelf (row) at a time"""
+    def __init__(self, size, padding=1):
+        self.size = size
+        self.padding = padding
+
+        self.shelf_y = 0 #top of the current shelf
+        self.shelf_h = 0
+        self.x = 0
+        self.used = 0 #pixels covered by images
+        self.images = {} #name:(surface, area)
+
+        self.texture = None
+
+    def fit(self, name, surf):
+        """Place surf, returns its area or None if the page is full"""
+        w, h = surf.get_size()
+        pw, ph = self.size
+        p = self.padding
+        if w+p*2 > pw or h+p*2 > ph:
+            return None
+        if self.x + w + p*2 > pw: #next shelf
+            self.shelf_y += self.shelf_h
+            self.shelf_h = 0
+            self.x = 0
+        if self.shelf_y + h + p*2 > ph:
+            return None
+
+        area = (self.x+p, self.shelf_y+p, self.x+p+w, self.shelf_y+p+h)
+        self.x += w + p*2
+        self.shelf_h = max(self.shelf_h, h + p*2)
+        self.used += w*h
+        self.images[name] = (surf, area)
+        return area
+
+    def get_height(self):
+        """Height actually needed, rounded up to a power of two
+           unless the card takes any size"""
+        if display.get_npot_supported():
+            return max(1, self.shelf_y + self.shelf_h)
+        h = 2
+        while h < self.shelf_y + self.shelf_h:
+            h *= 2
+        return min(h, self.size[1])
+
+    def get_surface(self):
+        surf = pygame.Surface(self.size, SRCALPHA, 32)
+        surf.fill((0,0,0,0))
+        for img, area in self.images.values():
+            surf.blit(img, area[:2])
+        return surf
+
+    def build(self):
+        """Compile the page into a texture"""
+        self.size = self.size[0], self.get_height()
+        self.texture = texture.Texture()
+        self.texture.name = 'atlas page'
+        self.texture.source = self.get_surface #images are kept anyway
+        self.texture._from_image(self.get_surface())
+        return self.texture
+
+    def get_region(self, name):
+        return texture.TextureRegion(self.texture, self.images[name][1])
+
+class AtlasBuilder(object):
+    """Packs images into as few atlas textures as possible.
+       Add pygame surfaces by name, then build() to get a
+       {name:TextureRegion} dict - regions work anywhere a texture
+       from Texture.get_region does.
+       Images too big for an atlas are not packed, see build."""
+    def __init__(self, size=1024, padding=1):
+        size = min(size, display.get_max_texture_size())
+        self.size = (size, size)
+        self.padding = padding
+
+        self.pending = []
+        self.pages = []
+
+    def add(self, name, surf):
+        self.pending.append((name, surf))
+
+    def build(self):
+        """Pack and compile everything added since the last build.
+           Returns (regions, left_over) - left_over is a list of
+           (name, surface) that did not fit in a page"""
+        #tallest first keeps shelves tight
+        todo = sorted(self.pending, key=lambda x: -x[1].get_height())
+        self.pending = []
+
+        pages = []
+        left = []
+        for name, surf in todo:
+            for page in pages:
+                if page.fit(name, surf):
+                    break
+            else:
+                page = AtlasPage(self.size, self.padding)
+                if page.fit(name, surf):
+                    pages.append(page)
+                else:
+                    left.append((name, surf))
+
+        regions = {}
+        for page in pages:
+            page.build()
+            for name in page.images:
+                regions[name] = page.get_region(name)
+        self.pages.extend(pages)
+        return regions, left
+
+    def report(self):
+        """Return a list of (size, images, usage) for each page,
+           usage being the fraction of the texture covered by images"""
+        ret = []
+        for page in self.pages:
+            w, h = page.size
+            ret.append((page.size, len(page.images), page.used*1.0/(w*h)))
+        return ret
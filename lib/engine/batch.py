@@ -0,0 +1,129 @@
+import include
+from include import *
+
+import storage
+
+def get_frame_texture(texture):
+    """Animated textures (and their clones and regions) are drawn with the
+       texture of the frame showing now"""
+    if hasattr(texture, 'get_frame'):
+        return texture.textures[texture.get_frame()]
+    return texture
+
+class _Run(object):
+    """Quads that share a texture - buffers are kept and reused between flushes"""
+    def __init__(self, size=64):
+        self.texture = None
+        self.count = 0 #quads
+        self.verts = numpy.zeros((size*4, 3), "f")
+        self.texcs = numpy.zeros((size*4, 2), "f")
+        self.colors = numpy.zeros((size*4, 4), "f")
+
+    def grow(self):
+        size = len(self.verts)*2
+        self.verts = numpy.resize(self.verts, (size, 3))
+        self.texcs = numpy.resize(self.texcs, (size, 2))
+        self.colors = numpy.resize(self.colors, (size, 4))
+
+class SpriteBatch(object):
+    """Collects textured quads and draws them with one glDrawArrays per texture.
+       ordered keeps the draw order exactly - a new run starts whenever the
+           texture changes - otherwise all quads of a texture go together
+       use_vbo streams the buffers through a VBOArray, if available"""
+    def __init__(self, ordered=False, use_vbo=False):
+        self.ordered = ordered
+        self.use_vbo = use_vbo and VBO_AVAILABLE
+
+        self.runs = []
+        self.used = 0 #runs holding quads since the last flush
+        self.by_tex = {}
+
+        self.array = None
+        self.norms = numpy.zeros((0, 3), "f")
+
+        self.draw_calls = 0 #made by the last flush
+
+    def _get_run(self, texture):
+        gl_tex = texture.gl_tex
+        if self.ordered:
+            if self.used and self.runs[self.used-1].texture.gl_tex == gl_tex:
+                return self.runs[self.used-1]
+        elif gl_tex in self.by_tex:
+            return self.by_tex[gl_tex]
+
+        if self.used == len(self.runs):
+            self.runs.append(_Run())
+        run = self.runs[self.used]
+        run.texture = texture
+        run.count = 0
+        self.used += 1
+        self.by_tex[gl_tex] = run
+        return run
+
+    def add(self, texture, rect, coords, color=(1,1,1,1)):
+        """Queue a quad.
+           rect is (x, y, w, h) on screen
+           coords are the texture coords of the topleft, bottomleft,
+               bottomright and topright corners (see Image2D.coords)
+           color must be rgba 0-1"""
+        run = self._get_run(get_frame_texture(texture))
+        i = run.count*4
+        if i+4 > len(run.verts):
+            run.grow()
+        x, y, w, h = rect
+        run.verts[i:i+4] = ((x, y, 0), (x, y+h, 0),
+                            (x+w, y+h, 0), (x+w, y, 0))
+        run.texcs[i:i+4] = coords
+        run.colors[i:i+4] = color
+        run.count += 1
+
+    def get_array(self):
+        if not self.array:
+            if self.use_vbo:
+                self.array = storage.VBOArray(GL_QUADS, 4, "stream")
+            else:
+                self.array = storage.VertexArray(GL_QUADS, 4)
+        return self.array
+
+    def flush(self):
+        """Draw everything queued and empty the batch"""
+        self.draw_calls = 0
+        if not self.used:
+            return
+        array = self.get_array()
+        for run in self.runs[:self.used]:
+            if not run.count:
+                continue
+            n = run.count*4
+            if len(self.norms) < n:
+                self.norms = numpy.array([[0,1,0]]*len(run.verts), "f")
+
+            array.texture = run.texture
+            if self.use_vbo:
+                array.reset_verts(run.verts[:n])
+                array.reset_texcs(run.texcs[:n])
+                array.reset_colors(run.colors[:n])
+                array.reset_norms(self.norms[:n])
+            else:
+                array.verts = run.verts[:n]
+                array.texcs = run.texcs[:n]
+                array.colors = run.colors[:n]
+                array.norms = self.norms[:n]
+                array.max_size = n
+            array.render()
+            self.draw_calls += 1
+        self.clear()
+
+    def clear(self):
+        """Drop everything queued, keeping the buffers"""
+        for run in self.runs[:self.used]:
+            run.count = 0
+        self.used = 0
+        self.by_tex = {}
+
+sprites = SpriteBatch(ordered=True) #2d sprites and gui quads are queued here
+
+def flush():
+    """Draw the queued sprites - call before changing the matrix, clip or
+       anything else the queued quads must be drawn under"""
+    sprites.flush()
@@ -1,7 +1,11 @@
 import include
 from include import *
 
+import batch
+import helpers
+import misc
 import texture
+from state import cache
 
 
 #display controller
@@ -17,11 +21,16 @@ def set_display(display):
 def get_max_texture_size():
     return get_display().MAX_TEXTURE_SIZE
 
+def get_npot_supported():
+    """Whether textures can be any size, not just powers of two"""
+    return get_display().NPOT_SUPPORTED
+
 class Display(object):
     """This object controls initialization, modification, and destroying of the display"""
     def __init__(self):
         self.blank_texture = None
         self.MAX_TEXTURE_SIZE = 2**13 #max pygame can handle
+        self.NPOT_SUPPORTED = False
         self.screen = Screen()
 
     def setup(self, screen_size=None, screen_size_2d=None,
@@ -54,18 +63,33 @@ class Display(object):
         #this has to be set here...
         self.MAX_TEXTURE_SIZE = min((glGetIntegerv(GL_MAX_TEXTURE_SIZE),
                                      self.MAX_TEXTURE_SIZE))
+        self.NPOT_SUPPORTED = self.check_npot()
 
         self.init_opengl()
 
         self.blank_texture = texture.Texture()
         self.blank_texture.empty((2,2), (255,255,255,255))
 
+    def check_npot(self):
+        """OpenGL 2.0 made any texture size legal, before that it needs
+           GL_ARB_texture_non_power_of_two"""
+        try:
+            if int(glGetString(GL_VERSION).split('.')[0]) >= 2:
+                return True
+            return 'GL_ARB_texture_non_power_of_two' in glGetString(GL_EXTENSIONS).split()
+        except:
+            return False
+
     def clear(self):
-        glDisable(GL_SCISSOR_TEST)
+        batch.sprites.clear() #anything queued would be cleared anyway
+        misc.anim_clock.tick()
+        helpers.trim_textures()
+        cache.disable(GL_SCISSOR_TEST)
         glClear(GL_DEPTH_BUFFER_BIT | GL_COLOR_BUFFER_BIT)
-        glEnable(GL_SCISSOR_TEST)
+        cache.enable(GL_SCISSOR_TEST)
 
     def refresh(self):
+        batch.flush()
         pygame.display.flip()
 
     def destroy(self):
@@ -77,19 +101,20 @@ class Display(object):
         self.blank_texture = None
 
     def init_opengl(self):
-        glEnable(GL_TEXTURE_2D)
-        glEnable(GL_COLOR_MATERIAL)
+        cache.reset() #new context
+        cache.enable(GL_TEXTURE_2D)
+        cache.enable(GL_COLOR_MATERIAL)
         glColorMaterial(GL_FRONT, GL_AMBIENT_AND_DIFFUSE)
 
-        glEnable(GL_LIGHTING)
-        glEnable(GL_NORMALIZE)
+        cache.enable(GL_LIGHTING)
+        cache.enable(GL_NORMALIZE)
         glShadeModel(GL_SMOOTH)
-        glEnable(GL_DEPTH_TEST)
+        cache.enable(GL_DEPTH_TEST)
         glDepthFunc(GL_LEQUAL)
         glHint(GL_PERSPECTIVE_CORRECTION_HINT, GL_NICEST)
-        glEnable(GL_SCISSOR_TEST)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glEnable(GL_BLEND)
+        cache.enable(GL_SCISSOR_TEST)
+        cache.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        cache.enable(GL_BLEND)
 
         glPointSize(1)
 
@@ -99,7 +124,7 @@ class Display(object):
         glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
         glFrontFace(GL_CCW)
         glCullFace(GL_BACK)
-        glEnable(GL_CULL_FACE)
+        cache.enable(GL_CULL_FACE)
 
 
     #Functions for applying updates/changes to attributes
@@ -151,9 +176,9 @@ class Display(object):
 
         glFogfv(GL_FOG_COLOR, self.screen.fog_color)
         if self.screen.fog:
-            glEnable(GL_FOG)
+            cache.enable(GL_FOG)
         else:
-            glDisable(GL_FOG)
+            cache.disable(GL_FOG)
         glFogf(GL_FOG_START, min)
         glFogf(GL_FOG_END, max)
 
@@ -162,9 +187,9 @@ class Display(object):
             self.screen.lighting = on
 
         if self.screen.lighting:
-            glEnable(GL_LIGHTING)
+            cache.enable(GL_LIGHTING)
         else:
-            glDisable(GL_LIGHTING)
+            cache.disable(GL_LIGHTING)
 
     def set_near_far_view(self, near=PYGGEL_NOCHANGE,
                           far=PYGGEL_NOCHANGE):
@@ -178,6 +203,7 @@ class Display(object):
             self.screen.view_angle = angle
 
     def set_2d(self):
+        batch.flush()
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
 
@@ -187,13 +213,14 @@ class Display(object):
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
-        glDisable(GL_DEPTH_TEST)
+        cache.disable(GL_DEPTH_TEST)
 
         rx = 1.0 * self.screen.screen_size[0] / self.screen.screen_size_2d[0]
         ry = 1.0 * self.screen.screen_size[1] / self.screen.screen_size_2d[1]
         glScalef(rx, ry, 1)
 
     def set_3d(self):
+        batch.flush()
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
 
@@ -204,7 +231,7 @@ class Display(object):
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
-        glEnable(GL_DEPTH_TEST)
+        cache.enable(GL_DEPTH_TEST)
 
 
 #screen/opengl/pygame params controller
@@ -285,16 +312,18 @@ class Screen(object):
 
     def push_clip(self, new):
         """Push a new rendering clip onto the stack - used to limit rendering to a small area."""
+        batch.flush()
         new = Clip(new, self)
         self.clips.append(new)
-        glScissor(*new.get_clip())
+        cache.scissor(new.get_clip())
 
     def pop_clip(self):
         """Pop the last clip off the stack."""
         if len(self.clips) == 1:
             return #don't pop the starting clip!
+        batch.flush()
         self.clips.pop()
-        glScissor(*self.clips[-1].get_clip())
+        cache.scissor(self.clips[-1].get_clip())
 
     def get_mouse_pos(self):
         """Return mouse pos in relation to the real screen size."""
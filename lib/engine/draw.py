@@ -3,6 +3,8 @@ from include import *
 
 import display
 import misc
+from batch import sprites, flush
+from state import cache
 
 
 def rect2d(area, color=(1,1,1,1), texture=None, tex_scale=True):
@@ -17,26 +19,14 @@ def rect2d(area, color=(1,1,1,1), texture=None, tex_scale=True):
     else:
         w = clamp(0, texture.size[0], area.width)
         h = clamp(0, texture.size[1], area.height)
-    topleft = texture.coord(0, 0)
-    topright = texture.coord(w,0)
-    bottomleft = texture.coord(0,h)
-    bottomright = texture.coord(w,h)
-    texture.bind()
-
-    glColor4f(*misc.Color(color).get_rgba1())
-    glBegin(GL_QUADS)
-    glTexCoord2f(*topleft)
-    glVertex3f(area.left, area.top, 0)
-    glTexCoord2f(*bottomleft)
-    glVertex3f(area.left, area.bottom, 0)
-    glTexCoord2f(*bottomright)
-    glVertex3f(area.right, area.bottom, 0)
-    glTexCoord2f(*topright)
-    glVertex3f(area.right, area.top, 0)
-    glEnd()
+    coords = (texture.coord(0, 0), texture.coord(0, h),
+              texture.coord(w, h), texture.coord(w, 0))
+    sprites.add(texture, (area.left, area.top, area.width, area.height),
+                coords, misc.Color(color).get_rgba1())
 
 def lines2d(pairs, color=(1,1,1,1)):
-    glColor4f(*misc.Color(color).get_rgba1())
+    flush()
+    cache.set_color(misc.Color(color).get_rgba1())
     glBegin(GL_LINES)
     for pair in pairs:
         glVertex3f(pair[0][0], pair[0][1], 0)
@@ -4,9 +4,15 @@ from include import *
 
 import display
 import image
+import misc
+import storage
 import texture
+from batch import flush as flush_sprites
+from state import cache
 
 class Font2D(object):
+    text_cache_size = 256 #compiled strings kept
+    measure_cache_size = 1024 #measured strings kept
     def __init__(self, name=None, tex_size=1024, def_size=32):
         self.name = name
         self.tex_size = tex_size
@@ -52,19 +58,54 @@ class Font2D(object):
         self.glyph_map = glyph_map
         self.fsize = fsize
 
-    def get_size(self, string, size=None):
+        self.text_cache = misc.LRUCache(self.text_cache_size)
+
+        #glyph sizes, by char and - for plain ascii strings - by char code
+        self.advances = {}
+        self.heights = {}
+        self.ascii_advances = numpy.zeros(256, "f")
+        self.ascii_heights = numpy.zeros(256, "f")
+        self.ascii_known = numpy.zeros(256, bool) #codes with a glyph
+        for i in char_map:
+            x,y,w,h = char_map[i]
+            self.advances[i] = w
+            self.heights[i] = h
+            self.ascii_advances[ord(i)] = w
+            self.ascii_heights[ord(i)] = h
+            self.ascii_known[ord(i)] = True
+        self.measure_cache = misc.LRUCache(self.measure_cache_size)
+
+    def _measure(self, string):
+        """Unscaled width, height of string"""
+        if not string:
+            return 0, 0
+        if isinstance(string, str):
+            codes = numpy.fromstring(string, "uint8")
+            #chars without a glyph go the slow way below - and raise there
+            if self.ascii_known[codes].all():
+                return (float(self.ascii_advances[codes].sum()),
+                        float(self.ascii_heights[codes].max()))
+        width = 0
+        height = 0
+        for char in string:
+            width += self.advances[char]
+            height = max(height, self.heights[char])
+        return width, height
+
+    def measure(self, string, size=None):
+        """Return the width, height string renders at size - memoized"""
         if size == None:
             size = self.def_size
+        wh = self.measure_cache.get(string)
+        if wh is None:
+            wh = self._measure(string)
+            self.measure_cache.put(string, wh)
 
         scale = size*1.0/self.fsize
-        height = 0
-        width = 0
-        for char in string:
-            glyph = self.glyph_map[char]
-            height = max((height, glyph.texture.size[1]))
-            width += glyph.texture.size[0]
+        return wh[0]*scale, wh[1]*scale
 
-        return width*scale, height*scale
+    def get_size(self, string, size=None):
+        return self.measure(string, size)
 
     def get_height(self, size=None):
         if size == None:
@@ -75,20 +116,63 @@ class Font2D(object):
 
         return height * scale
 
-    def render(self, string, pos, color=(1,1,1,1), size=None):
+    def _compile_text(self, string, scale):
+        """Compile the glyph quads of string into one display list"""
+        dlist = storage.DisplayList()
+        dlist.begin()
+        glBegin(GL_QUADS)
+        x = 0
+        for char in string:
+            glyph = self.glyph_map[char]
+            w, h = glyph.texture.size
+            w *= scale
+            h *= scale
+            tl, bl, br, tr = glyph.coords
+            glTexCoord2f(*tl)
+            glVertex3f(x, 0, 0)
+            glTexCoord2f(*bl)
+            glVertex3f(x, h, 0)
+            glTexCoord2f(*br)
+            glVertex3f(x+w, h, 0)
+            glTexCoord2f(*tr)
+            glVertex3f(x+w, 0, 0)
+            x += w
+        glEnd()
+        dlist.end()
+        return dlist
+
+    def get_text_mesh(self, string, size):
+        """Return the compiled display list for string at size - cached"""
+        key = (string, size)
+        mesh = self.text_cache.get(key)
+        if mesh is None:
+            mesh = self._compile_text(string, size*1.0/self.fsize)
+            self.text_cache.put(key, mesh)
+        return mesh
+
+    def render(self, string, pos, color=(1,1,1,1), size=None, batch=None):
+        """batch is an optional batch.SpriteBatch to queue the glyphs into,
+           otherwise the string is drawn with one cached display list"""
         if size == None:
             size = self.def_size
-        scale = size*1.0/self.fsize
+        color = misc.Color(color).get_rgba1()
+
+        if batch:
+            scale = size*1.0/self.fsize
+            x, y = pos
+            for char in string:
+                glyph = self.glyph_map[char]
+                w, h = glyph.texture.size
+                batch.add(glyph.texture, (x, y, w*scale, h*scale), glyph.coords, color)
+                x += w*scale
+            return
+
+        flush_sprites() #quads queued before the text go under it
         glPushMatrix()
         glTranslatef(pos[0], pos[1], 0)
-        glScalef(scale,scale,1)
-
-        ind = 0
-        for char in string:
-            glyph = self.glyph_map[char]
-            glyph.render((ind, 0), color)
-            ind += glyph.texture.size[0]
-
+        cache.set_color(color)
+        self.tex.bind()
+        self.get_text_mesh(string, size).render()
         glPopMatrix()
 
     def make_size(self, size=None):
@@ -117,7 +201,10 @@ class Font2Dcopy(object):
         if size == None:
             size = self.def_size
 
-        return self.other.get_size(string, size)
+        return self.other.measure(string, size)
+
+    def measure(self, string, size=None):
+        return self.get_size(string, size)
 
     def get_height(self, size=None):
         if size == None:
@@ -125,10 +212,10 @@ class Font2Dcopy(object):
 
         return self.other.get_height(size)
 
-    def render(self, string, pos, color=(1,1,1,1), size=None):
+    def render(self, string, pos, color=(1,1,1,1), size=None, batch=None):
         if size == None:
             size = self.def_size
-        self.other.render(string, pos, color, size)
+        self.other.render(string, pos, color, size, batch)
 
     def make_size(self, size=None):
         if size == None:
@@ -0,0 +1,70 @@
+"""Decoded GIF frames cached on disk.
+
+Decoding a GIF through PIL (palettes, frame compositing) is slow, so the
+finished RGBA frames are kept in cache_dir as one .npy per file - shape
+(frames, height, width, 4), uint8, readable with numpy.load (mmap_mode
+works too) - next to a small .txt with the source mtime and frame
+durations. An entry is used only if the file's mtime still matches."""
+
+import os
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+import pygame
+import numpy
+
+cache_dir = os.path.join('data', 'cache', 'gif')
+
+def get_paths(filename):
+    """Return the (frames, info) cache paths for filename"""
+    key = sha1(os.path.abspath(filename)).hexdigest()
+    base = os.path.join(cache_dir, key)
+    return base+'.npy', base+'.txt'
+
+def load(filename):
+    """Return [[surface, duration], ...] for filename from the cache,
+       or None if it is not there or out of date"""
+    fpath, ipath = get_paths(filename)
+    try:
+        f = open(ipath)
+        info = f.read().split()
+        f.close()
+        if float(info[0]) != os.path.getmtime(filename):
+            return None
+        durations = map(float, info[1:])
+        data = numpy.load(fpath, mmap_mode='r')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    if len(data) != len(durations):
+        return None
+
+    frames = []
+    h, w = data.shape[1:3]
+    for i in xrange(len(data)):
+        surf = pygame.image.fromstring(data[i].tostring(), (w, h), 'RGBA')
+        frames.append([surf, durations[i]])
+    return frames
+
+def save(filename, frames):
+    """Store [[surface, duration], ...] for filename - all frames must be
+       the same size. Failing to write is not an error, just no cache."""
+    if not frames:
+        return
+    fpath, ipath = get_paths(filename)
+    w, h = frames[0][0].get_size()
+    data = numpy.zeros((len(frames), h, w, 4), 'uint8')
+    for i, frame in enumerate(frames):
+        data[i] = numpy.fromstring(pygame.image.tostring(frame[0], 'RGBA'),
+                                   'uint8').reshape((h, w, 4))
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        numpy.save(fpath, data)
+        f = open(ipath, 'w')
+        f.write(' '.join([repr(os.path.getmtime(filename))] +
+                         [repr(i[1]) for i in frames]))
+        f.close()
+    except (IOError, OSError):
+        pass
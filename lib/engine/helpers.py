@@ -1,12 +1,26 @@
 import texture
 import animated_texture
+import atlas
 import storage
 import image
 import font
+import misc
 
 import include
 from include import *
 
+import functools, weakref
+
+DEFAULT_BUDGET = 128*1024*1024 #bytes of GPU memory a TextureHandler may use
+
+_handlers = weakref.WeakSet() #live TextureHandlers, for trim_textures
+
+def trim_textures():
+    """Trim every TextureHandler to its budget - Display.clear calls this
+       once per frame"""
+    for i in list(_handlers):
+        i.trim()
+
 def get_best_array_type(render_type=None, max_size=10,
                         opt=0):
     """This function returns the best possible array type for what you need.
@@ -50,8 +64,22 @@ def load_image2D(name, area=None):
     return image.Image2D(load_texture(name), area)
 
 class TextureHandler(object):
-    def __init__(self):
+    def __init__(self, use_atlas=False, atlas_size=1024, budget=DEFAULT_BUDGET):
+        """use_atlas packs still images into shared atlas textures
+           (when they are first asked for), instead of one texture each
+           budget is the most GPU memory (bytes) the textures may hold -
+               the ones drawn longest ago are unloaded to stay under it,
+               and reload from their files the next time they are drawn.
+               None for no limit"""
         self.textures = {}
+        self.budget = budget
+        self.memory = texture.MemoryCounter() #GPU bytes of our textures
+        _handlers.add(self)
+
+        self.use_atlas = use_atlas
+        self.atlas = None
+        if use_atlas:
+            self.atlas = atlas.AtlasBuilder(atlas_size)
 
     def make_name(self, dire):
         path = []
@@ -65,22 +93,161 @@ class TextureHandler(object):
             self.load_texture(os.path.join(dire, i), replace)
 
     def load_texture(self, name, replace=False):
-        if name.split('.')[-1].lower() in ('png', 'bmp', 'jpg', 'gif'):
+        iname = name.split('.')[-1].lower()
+        if iname in ('png', 'bmp', 'jpg', 'gif'):
             short = self.make_name(name)
             if replace or (not short in self.textures):
-                self.textures[short] = load_texture(name)
+                if self.use_atlas and iname != 'gif':
+                    self.atlas.add(short, pygame.image.load(name))
+                    self.textures[short] = None #packed on build_atlas
+                else:
+                    self.textures[short] = load_texture(name)
+                    self._track(self.textures[short])
+                    self.trim()
+
+    def queue_dir(self, dire, loader, replace=False):
+        """Like load_dir, but files are decoded on the threads of loader
+           (an AssetLoader, see lib/asset_loader.py) and uploaded to GL a
+           few at a time as loader.update is called"""
+        for i in os.listdir(dire):
+            name = os.path.join(dire, i)
+            iname = name.split('.')[-1].lower()
+            if not iname in ('png', 'bmp', 'jpg', 'gif'):
+                continue
+            if replace or (not self.make_name(name) in self.textures):
+                if iname == 'gif':
+                    loader.add(name, animated_texture.GIFImage, self._finish_gif)
+                else:
+                    loader.add(name, pygame.image.load, self._finish_image)
+
+    def _finish_image(self, name, surf):
+        short = self.make_name(name)
+        if self.use_atlas:
+            self.atlas.add(short, surf)
+            self.textures[short] = None #packed on build_atlas
+        else:
+            new = texture.Texture()
+            new.name = short
+            new.source = functools.partial(pygame.image.load, name)
+            new._from_image(surf)
+            self.textures[short] = new
+            self._track(new)
+            self.trim()
+
+    def _finish_gif(self, name, gif):
+        new = animated_texture.Texture()
+        new._from_image(gif)
+        self.textures[self.make_name(name)] = new
+        self._track(new)
+        self.trim()
+
+    def build_atlas(self):
+        """Pack images waiting for the atlas"""
+        regions, left = self.atlas.build()
+        self.textures.update(regions)
+        for name, surf in left: #too big, own texture
+            new = texture.Texture()
+            new.name = name
+            new.source = lambda surf=surf: surf #kept by the atlas anyway
+            new._from_image(surf)
+            self.textures[name] = new
+            self._track(new)
+        for page in self.atlas.pages:
+            self._track(page.texture)
+        self.trim()
+
+    def _track(self, tex):
+        """Count the GPU memory of tex (and gif frames) in self.memory"""
+        if isinstance(tex, animated_texture.Texture):
+            group = tex.textures
+        else:
+            group = [tex]
+        for i in group:
+            if i.counter is self.memory:
+                continue
+            if i.counter:
+                i.counter.bytes -= i._counted
+            i.counter = self.memory
+            self.memory.bytes += i._counted
+
+    def get_texture_groups(self):
+        """Lists of the texture.Textures behind the handler's textures,
+           that are unloaded together - the frames of a gif, or one
+           image or atlas page"""
+        ret = []
+        for i in self.textures.values():
+            if isinstance(i, texture.Texture):
+                ret.append([i])
+            elif isinstance(i, animated_texture.Texture) and i.textures:
+                ret.append(i.textures)
+        if self.atlas:
+            ret.extend([[page.texture] for page in self.atlas.pages])
+        return ret
+
+    def get_gl_textures(self):
+        """Every texture.Texture behind the handler's textures -
+           atlas pages and gif frames included"""
+        ret = []
+        for i in self.get_texture_groups():
+            ret.extend(i)
+        return ret
+
+    def get_resident_bytes(self):
+        return self.memory.bytes
+
+    def trim(self):
+        """Unload the textures drawn longest ago until the rest fit in
+           budget. Ones drawn this frame or that can't be reloaded stay.
+           The frames of a gif count as drawn when any of them was, and
+           go together - else the ones not showing would be thrashed"""
+        if self.budget is None or self.memory.bytes <= self.budget:
+            return
+        groups = self.get_texture_groups()
+        used = self.memory.bytes
+        frame = misc.anim_clock.frame
+        groups = [(max([i.last_used for i in group]), group) for group in groups]
+        groups.sort(key=lambda x: x[0])
+        for last_used, group in groups:
+            if used <= self.budget:
+                break
+            if last_used >= frame:
+                continue
+            for tex in group:
+                if tex.source and tex.is_resident():
+                    used -= tex.get_memory()[1]
+                    tex.unload()
+
+    def get_memory_report(self):
+        """See texture.get_memory_report"""
+        return texture.get_memory_report()
+
+    def get_atlas_report(self):
+        """See atlas.AtlasBuilder.report"""
+        if self.atlas:
+            return self.atlas.report()
+        return []
 
     def get_texture(self, name):
+        if self.atlas and self.atlas.pending:
+            self.build_atlas()
         if name in self.textures:
             tex = self.textures[name]
             if isinstance(tex, texture.Texture):
                 return texture.TextureClone(tex)
+            elif isinstance(tex, texture.TextureRegion):
+                return tex
             else:
                 return animated_texture.TextureClone(tex)
 
     def free_textures(self):
         for i in self.textures.values():
+            if i is None or isinstance(i, texture.TextureRegion):
+                continue #atlas pages go below
             i.free_texture()
+        if self.atlas:
+            for page in self.atlas.pages:
+                page.texture.free_texture()
+            self.atlas.pages = []
         self.textures = {}
 
 class FontHandler2D(object):
@@ -116,6 +283,7 @@ class FontHandler2D(object):
             return self.fonts[name].make_size(size)
 
     def free_fonts(self):
-        self.fonts = {} #cross fingers
-        #potential mem leak if textures aren't really freed...
+        for i in self.fonts.values():
+            i.tex.free_texture()
+        self.fonts = {}
 
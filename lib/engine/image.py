@@ -1,46 +1,20 @@
-import storage
-
 import include
 from include import *
 
 import misc
+from batch import sprites
 
 class Image2D(object):
-    def __init__(self, texture, area=None, dlist=None):
+    def __init__(self, texture, area=None):
         if area == None:
             self.texture = texture
         else:
             self.texture = texture.get_region(area)
 
-        self.dlist = dlist
-        if not dlist:
-            self._compile()
-
-    def _compile(self):
-        #Maybe changeme - just using display lists for images atm
-        #they are lighter code-wise
-        self.dlist = storage.DisplayList()
-
         w,h = self.texture.size
-        topleft = self.texture.coord(0, 0)
-        topright = self.texture.coord(w,0)
-        bottomleft = self.texture.coord(0,h)
-        bottomright = self.texture.coord(w,h)
-
-        #render
-        self.dlist.begin()
-        glBegin(GL_QUADS)
-        glTexCoord2f(*topleft)
-        glVertex3f(0,0,0)
-        glTexCoord2f(*bottomleft)
-        glVertex3f(0,h,0)
-        glTexCoord2f(*bottomright)
-        glVertex3f(w,h,0)
-        glTexCoord2f(*topright)
-        glVertex3f(w,0,0)
-        glEnd()
-
-        self.dlist.end()
+        #topleft, bottomleft, bottomright, topright - for batching
+        self.coords = (self.texture.coord(0, 0), self.texture.coord(0, h),
+                       self.texture.coord(w, h), self.texture.coord(w, 0))
 
     def get_rect(self):
         return pygame.Rect((0,0), self.texture.size)
@@ -54,12 +28,12 @@ class Image2D(object):
 
     def clone(self):
         """Reference copy"""
-        return Image2D(self.texture, None, self.dlist)
+        return Image2D(self.texture)
 
-    def render(self, pos, colorize=(1,1,1,1)):
-        glPushMatrix()
-        glTranslatef(pos[0], pos[1], 0)
-        glColor4f(*misc.Color(colorize).get_rgba1())
-        self.texture.bind()
-        self.dlist.render()
-        glPopMatrix()
+    def render(self, pos, colorize=(1,1,1,1), batch=None):
+        """Queue the image into batch (a batch.SpriteBatch), by default
+           the shared batch.sprites that is drawn before the matrix or
+           clip change or the screen is flipped"""
+        w,h = self.texture.size
+        (batch or sprites).add(self.texture, (pos[0], pos[1], w, h),
+                               self.coords, misc.Color(colorize).get_rgba1())
@@ -73,3 +73,9 @@ def clamp_area(to, val):
     y2 = clamp(oy1, oy2, y2)
 
     return (x1,y1,x2,y2)
+
+def offset_area(to, val):
+    """Move val, an area local to area to, into to's space and clamp it"""
+    x1,y1,x2,y2 = val
+    ox, oy = to[0], to[1]
+    return clamp_area(to, (x1+ox, y1+oy, x2+ox, y2+oy))
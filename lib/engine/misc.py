@@ -1,3 +1,6 @@
+import collections
+import time
+
 class Color(object):
     def __init__(self, val, form=None):
         a = None
@@ -43,3 +46,53 @@ class Color(object):
 
     def get_rgba255(self):
         return map(int, (self.r*255, self.g*255, self.b*255, self.a*255))
+
+
+class LRUCache(object):
+    """Dict like cache that drops the least recently used items once
+       it holds more than max_size"""
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.items = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key in self.items:
+            val = self.items.pop(key)
+            self.items[key] = val #now the newest
+            self.hits += 1
+            return val
+        self.misses += 1
+        return default
+
+    def put(self, key, val):
+        if key in self.items:
+            self.items.pop(key)
+        self.items[key] = val
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+class AnimationClock(object):
+    """One time for every animation - sampled once a frame by tick()
+       (Display.clear, or GFXEngine.get_dirty_rects in game, does that),
+       so animations don't each ask the OS"""
+    def __init__(self):
+        self.now = time.time()
+        self.frame = 0
+
+    def tick(self):
+        self.now = time.time()
+        self.frame += 1
+
+anim_clock = AnimationClock()
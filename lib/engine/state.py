@@ -0,0 +1,146 @@
+"""Cache of the OpenGL state the engine changes most often.
+
+Every PyOpenGL call costs a lot of Python overhead, so the engine sets
+the bound texture, texture parameters, colour, scissor box, enabled caps
+and client arrays through cache, which skips any call that would leave
+the state as it already is. calls and skipped count what was sent to GL
+and what was avoided, see report().
+
+Anything that changes this state behind the cache's back must tell it -
+invalidate_color after drawing with a colour array, reset for a new
+context."""
+
+import include
+from include import *
+
+class StateCache(object):
+    def __init__(self):
+        self.calls = {} #name:calls made
+        self.skipped = {} #name:calls avoided
+        self.reset()
+
+    def reset(self):
+        """Forget everything, the GL state is unknown (new context)"""
+        self.texture = None
+        self.tex_params = {} #gl_tex:{pname:value}
+        self.color = None
+        self.scissor_box = None
+        self.caps = {} #cap:enabled
+        self.blend = None
+        self.arrays = set() #enabled client arrays
+
+    def _made(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _skip(self, name):
+        self.skipped[name] = self.skipped.get(name, 0) + 1
+
+    def bind_texture(self, gl_tex):
+        if gl_tex == self.texture:
+            self._skip('bind_texture')
+            return
+        glBindTexture(GL_TEXTURE_2D, gl_tex)
+        self.texture = gl_tex
+        self._made('bind_texture')
+
+    def tex_parameter(self, pname, value):
+        """Set a parameter of the bound texture"""
+        params = self.tex_params.setdefault(self.texture, {})
+        if params.get(pname) == value:
+            self._skip('tex_parameter')
+            return
+        if isinstance(value, float):
+            glTexParameterf(GL_TEXTURE_2D, pname, value)
+        else:
+            glTexParameteri(GL_TEXTURE_2D, pname, value)
+        params[pname] = value
+        self._made('tex_parameter')
+
+    def tex_wrap(self, wrap):
+        """Set all the wrap modes of the bound texture"""
+        params = self.tex_params.setdefault(self.texture, {})
+        if params.get('wrap') == wrap:
+            self._skip('tex_parameter')
+            return
+        for i in (GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T, GL_TEXTURE_WRAP_R):
+            glTexParameteri(GL_TEXTURE_2D, i, wrap)
+            params[i] = wrap
+        params['wrap'] = wrap
+        self._made('tex_parameter')
+
+    def forget_texture(self, gl_tex):
+        """gl_tex was deleted - a new texture may get its name"""
+        self.tex_params.pop(gl_tex, None)
+        if self.texture == gl_tex:
+            self.texture = None
+
+    def set_color(self, rgba):
+        rgba = tuple(rgba)
+        if rgba == self.color:
+            self._skip('color')
+            return
+        glColor4f(*rgba)
+        self.color = rgba
+        self._made('color')
+
+    def invalidate_color(self):
+        """The current colour is unknown - after drawing a colour array"""
+        self.color = None
+
+    def scissor(self, box):
+        box = tuple(box)
+        if box == self.scissor_box:
+            self._skip('scissor')
+            return
+        glScissor(*box)
+        self.scissor_box = box
+        self._made('scissor')
+
+    def enable(self, cap):
+        if self.caps.get(cap) is True:
+            self._skip('enable')
+            return
+        glEnable(cap)
+        self.caps[cap] = True
+        self._made('enable')
+
+    def disable(self, cap):
+        if self.caps.get(cap) is False:
+            self._skip('enable')
+            return
+        glDisable(cap)
+        self.caps[cap] = False
+        self._made('enable')
+
+    def blend_func(self, src, dst):
+        if (src, dst) == self.blend:
+            self._skip('blend_func')
+            return
+        glBlendFunc(src, dst)
+        self.blend = src, dst
+        self._made('blend_func')
+
+    def client_arrays(self, arrays):
+        """Enable exactly the client arrays given. Arrays are left enabled
+           after drawing - immediate mode drawing doesn't use them"""
+        arrays = set(arrays)
+        if arrays == self.arrays:
+            self._skip('client_arrays')
+            return
+        for i in self.arrays - arrays:
+            glDisableClientState(i)
+        for i in arrays - self.arrays:
+            glEnableClientState(i)
+        self.arrays = arrays
+        self._made('client_arrays')
+
+    def report(self):
+        """Return a list of (name, calls made, calls skipped)"""
+        names = sorted(set(self.calls) | set(self.skipped))
+        return [(i, self.calls.get(i, 0), self.skipped.get(i, 0)) for i in names]
+
+    def clear_counts(self):
+        self.calls = {}
+        self.skipped = {}
+
+cache = StateCache()
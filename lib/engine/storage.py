@@ -2,6 +2,7 @@ import include
 from include import *
 
 import display
+from state import cache
 
 class DisplayList(object):
     """An object to compile and store an OpenGL display list"""
@@ -28,6 +29,9 @@ class DisplayList(object):
         except:
             pass #already cleared!
 
+#every array attribute the vertex arrays use
+ALL_ARRAYS = (GL_VERTEX_ARRAY, GL_COLOR_ARRAY, GL_TEXTURE_COORD_ARRAY, GL_NORMAL_ARRAY)
+
 class VertexArray(object):
     """An object to store and render an OpenGL vertex array of vertices, colors and texture coords"""
     def __init__(self, render_type=None, max_size=100):
@@ -50,10 +54,7 @@ class VertexArray(object):
         """Render the array"""
         self.texture.bind()
 
-        glEnableClientState(GL_VERTEX_ARRAY)
-        glEnableClientState(GL_COLOR_ARRAY)
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
-        glEnableClientState(GL_NORMAL_ARRAY)
+        cache.client_arrays(ALL_ARRAYS)
 
         glVertexPointerf(self.verts)
         glColorPointerf(self.colors)
@@ -61,11 +62,7 @@ class VertexArray(object):
         glNormalPointerf(self.norms)
 
         glDrawArrays(self.render_type, 0, self.max_size)
-
-        glDisableClientState(GL_VERTEX_ARRAY)
-        glDisableClientState(GL_COLOR_ARRAY)
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-        glDisableClientState(GL_NORMAL_ARRAY)
+        cache.invalidate_color()
 
     def reset_verts(self, data):
         self.verts = numpy.array(data, "f")
@@ -169,30 +166,24 @@ class VBOArray(object):
                 glBufferData(GL_ARRAY_BUFFER, self.norms.data, self.usage_gl)
                 self._cached_cn = []
         self.texture.bind()
+        cache.client_arrays(ALL_ARRAYS)
 
         self.verts.bind()
-        glEnableClientState(GL_VERTEX_ARRAY)
         glVertexPointerf(self.verts)
 
         self.colors.bind()
-        glEnableClientState(GL_COLOR_ARRAY)
         glColorPointerf(self.colors)
 
         self.texcs.bind()
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
         glTexCoordPointerf(self.texcs)
 
         self.norms.bind()
-        glEnableClientState(GL_NORMAL_ARRAY)
         glNormalPointerf(self.norms)
 
         glDrawArrays(self.render_type, 0, self.max_size)
+        cache.invalidate_color()
 
         glBindBuffer(GL_ARRAY_BUFFER, 0)
-        glDisableClientState(GL_VERTEX_ARRAY)
-        glDisableClientState(GL_COLOR_ARRAY)
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-        glDisableClientState(GL_NORMAL_ARRAY)
 
     def reset_verts(self, data):
         self.verts.set_array(numpy.array(data, "f"))
@@ -2,38 +2,92 @@ import include
 from include import *
 
 import display
+import misc
+from state import cache
 
-class Texture(object):
-    _free = []
-    _bound = None
-    _repeat = False
+import weakref, functools
+
+class MemoryCounter(object):
+    """Running total of the GPU bytes held by the textures pointing at it,
+       so nobody has to sum them up to know"""
     def __init__(self):
+        self.bytes = 0
 
-        self.gl_tex = None
+class Texture(object):
+    _all = weakref.WeakSet() #live textures, for get_memory_report
+    keep_data = False #keep tex_data (the RGBA string) after uploading
+    def __init__(self):
+        self.name = ''
+        self._gl_tex = None
+        self.source = None #returns the surface again, to reload after unload()
+        self.last_used = misc.anim_clock.frame #clock frame last bound on
         self.size = (0,0)
+        self.gl_size = (0,0) #size on the card, padded without NPOT support
         self.size_mult = (1,1)
         self.area = (0,0,1,1)
 
         self.tex_data = None
         self.repeat = False
 
+        self.counter = None #MemoryCounter kept up to date on upload/delete
+        self._counted = 0
+
         self.mts = display.get_max_texture_size()
+        Texture._all.add(self)
+
+    def _get_gl_tex(self):
+        """The GL texture name - reloading the texture if it was unloaded"""
+        if self._gl_tex is None and self.source:
+            self.reload()
+        return self._gl_tex
+    gl_tex = property(_get_gl_tex)
 
     def get_free_tex(self):
-        if self.gl_tex is not None:
-            return
+        if self._gl_tex is None:
+            self._gl_tex = glGenTextures(1)
 
-        if Texture._free:
-            self.gl_tex = Texture._free.pop()
-        else:
-            self.gl_tex = glGenTextures(1)
+    def _delete(self):
+        if self._gl_tex is None:
+            return
+        try:
+            glDeleteTextures([self._gl_tex])
+        except:
+            pass #context already gone
+        cache.forget_texture(self._gl_tex)
+        self._gl_tex = None
+        self._set_counted(0)
+
+    def _set_counted(self, num):
+        if self.counter:
+            self.counter.bytes += num - self._counted
+        self._counted = num
 
     def free_texture(self):
-        if not self.gl_tex in Texture._free:
-            Texture._free.append(self.gl_tex)
+        self._delete()
         self.size = (0,0)
+        self.gl_size = (0,0)
+        self.tex_data = None
+        self.source = None
+
+    def unload(self):
+        """Free the GL texture but keep everything needed to reload it
+           from source - which happens the next time it is bound"""
+        self._delete()
         self.tex_data = None
-        self.gl_tex = None
+
+    def reload(self):
+        self._from_image(self.source())
+
+    def is_resident(self):
+        return self._gl_tex is not None
+
+    def get_memory(self):
+        """Return (cpu, gpu) bytes used - cpu being the kept tex_data"""
+        cpu = len(self.tex_data[0]) if self.tex_data else 0
+        if self._gl_tex is None:
+            return cpu, 0
+        w, h = self.gl_size
+        return cpu, w*h*4
 
     def _get_next_biggest(self, x, y):
         """Get the next biggest power of two x and y sizes"""
@@ -49,9 +103,17 @@ class Texture(object):
 
         return nw, nh
 
+    def _get_gl_size(self, x, y):
+        """Size to upload an x by y image as"""
+        if display.get_npot_supported():
+            return min(x, self.mts), min(y, self.mts)
+        return self._get_next_biggest(x, y)
+
     def _from_file(self, filename):
         """Loads file"""
-        self._from_image(pygame.image.load(filename))
+        self.name = filename
+        self.source = functools.partial(pygame.image.load, filename)
+        self._from_image(self.source())
 
     def _from_image(self, image):
         """Creates a texture based on a raw Pygame Surface."""
@@ -67,7 +129,7 @@ class Texture(object):
         self.get_free_tex()
 
         size = image.get_size()
-        size2 = self._get_next_biggest(*size)
+        size2 = self._get_gl_size(*size)
         if size != size2:
             new = pygame.Surface(size2).convert_alpha()
             new.fill((0,0,0,0))
@@ -86,57 +148,47 @@ class Texture(object):
                           h1*1.0/h2)
 
         self.tex_data = (tdata, w2, h2)
+        self.gl_size = w2, h2
 
         self._from_tex_data()
+        if not self.keep_data:
+            self.tex_data = None
 
     def _from_tex_data(self):
-        Texture._bound = self.gl_tex
-        glBindTexture(GL_TEXTURE_2D, self.gl_tex)
+        self.last_used = misc.anim_clock.frame
+        cache.bind_texture(self._gl_tex)
         tdata, w, h = self.tex_data
 
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        #filters and wrap modes belong to the texture, they stay set
+        cache.tex_parameter(GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        cache.tex_parameter(GL_TEXTURE_MAG_FILTER, GL_LINEAR)
         glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, w, h, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, tdata)
+        self._set_counted(w*h*4)
 
-        if self.repeat != Texture._repeat:
-            Texture._repeat = self.repeat
-            if self.repeat:
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_R, GL_REPEAT)
-            else:
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
+        self._set_wrap(self.repeat)
 
         if ANI_AVAILABLE:
             try:
-                glTexParameterf(GL_TEXTURE_2D,GL_TEXTURE_MAX_ANISOTROPY_EXT,glGetFloat(GL_MAX_TEXTURE_MAX_ANISOTROPY_EXT))
+                cache.tex_parameter(GL_TEXTURE_MAX_ANISOTROPY_EXT,
+                                    float(glGetFloat(GL_MAX_TEXTURE_MAX_ANISOTROPY_EXT)))
             except:
                 pass
 
+    def _set_wrap(self, repeat):
+        if repeat:
+            cache.tex_wrap(GL_REPEAT)
+        else:
+            cache.tex_wrap(GL_CLAMP_TO_EDGE)
+
     def bind(self):
         """Binds the texture for usage"""
         self.bind_orepeat(self.repeat)
 
     def bind_orepeat(self, repeat):
-        if self.gl_tex != Texture._bound:
-            glBindTexture(GL_TEXTURE_2D, self.gl_tex)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            Texture._bound = self.gl_tex
-
-        if repeat != Texture._repeat:
-            Texture._repeat = repeat
-            if repeat:
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_R, GL_REPEAT)
-            else:
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
+        cache.bind_texture(self.gl_tex)
+        self._set_wrap(repeat)
+        self.last_used = misc.anim_clock.frame
 
     def coord(self, x, y):
         """Convert x,y coord to fit real tex"""
@@ -150,10 +202,21 @@ class Texture(object):
     def __del__(self):
         self.free_texture()
 
+def get_memory_report():
+    """Return a list of (name, size, cpu bytes, gpu bytes) for every
+       live texture, biggest first"""
+    ret = []
+    for tex in list(Texture._all):
+        if not tex.is_resident():
+            continue
+        cpu, gpu = tex.get_memory()
+        ret.append((tex.name, tex.gl_size, cpu, gpu))
+    ret.sort(key=lambda x: -(x[2]+x[3]))
+    return ret
+
 class TextureRegion(object):
     def __init__(self, tex, area):
         self.tex = tex
-        self.gl_tex = self.tex.gl_tex
         self.area = area
         self.repeat = False
 
@@ -161,6 +224,10 @@ class TextureRegion(object):
         y = self.area[3] - self.area[1]
         self.size = x, y
 
+    def _get_gl_tex(self):
+        return self.tex.gl_tex
+    gl_tex = property(_get_gl_tex)
+
     def bind(self):
         self.tex.bind_orepeat(False)
 
@@ -175,18 +242,23 @@ class TextureRegion(object):
         return self.tex.coord(x,y)
 
     def get_region(self, area):
-        return TextureRegion(self, clamp_area(self.area, area))
+        """area is local to this region - the new region is made on the
+           same texture, so it binds and maps coords like this one"""
+        return TextureRegion(self.tex, offset_area(self.area, area))
 
 
 class TextureClone(object):
     def __init__(self, tex):
         self.tex = tex
-        self.gl_tex = self.tex.gl_tex
 
         self.size = self.tex.size
         self.area = self.tex.area
         self.repeat = self.tex.repeat
 
+    def _get_gl_tex(self):
+        return self.tex.gl_tex
+    gl_tex = property(_get_gl_tex)
+
     def bind(self):
         self.tex.bind()
 
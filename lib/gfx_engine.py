@@ -5,6 +5,8 @@ from math import floor
 
 import GIFImage
 import load_mod_file
+import chunked_map
+from profiler import profiler
 
 tile_size = (64,32)
 
@@ -17,17 +19,50 @@ def ScreenToGrid(mx, my, cx, cy):
     return (mx-cx)/tile_size[0] - (my-cy)/tile_size[1], \
            (mx-cx)/tile_size[0] + (my-cy)/tile_size[1]
 
+#team colours, by index in the scenario's teams, and the key colour
+#team coloured images are painted with
+team_colors = [(255,0,0), (0,255,0), (0,0,255),
+               (255,255,0), (255,0,255), (0,255,255)]
+team_key = (127,127,127)
+
 def color_swap(surf, old, new):
-    for x in xrange(surf.get_width()):
-        for y in xrange(surf.get_height()):
-            rgb = tuple(surf.get_at((x,y))[:3])
-            if rgb == old:
-                surf.set_at((x,y), new[:3]+(255,))
+    """Turn every old rgb pixel of surf into opaque new, in place.
+       surf must be 24 or 32 bit (loaded images are, after convert_alpha)"""
+    pix = pygame.surfarray.pixels3d(surf)
+    mask = (pix[:,:,0] == old[0]) & (pix[:,:,1] == old[1]) & (pix[:,:,2] == old[2])
+    pix[mask] = new[:3]
+    del pix #unlocks surf
+    if surf.get_flags() & SRCALPHA:
+        alpha = pygame.surfarray.pixels_alpha(surf)
+        alpha[mask] = 255
+        del alpha
     return surf
 
 class ImageHandler(object):
     def __init__(self):
         self.images = {}
+        self.queued = set()
+        self.recolored = {} #(name, rgb):image
+        self.wanted = set() #(name, team) asked for before name was loaded
+
+    def queue_dir(self, dire, loader):
+        """Like load_dir, but decoded on loader's threads (see asset_loader)"""
+        for i in glob.glob(dire+'*.gif'):
+            short = os.path.split(i)[1]
+            if not (short in self.images or short in self.queued):
+                self.queued.add(short)
+                loader.add(i, GIFImage.GIFImage, self._finish_gif)
+        for i in glob.glob(dire+'*.png'):
+            short = os.path.split(i)[1]
+            if not (short in self.images or short in self.queued):
+                self.queued.add(short)
+                loader.add(i, pygame.image.load, self._finish_png)
+
+    def _finish_gif(self, path, img):
+        self.images[os.path.split(path)[1]] = img
+
+    def _finish_png(self, path, img):
+        self.images[os.path.split(path)[1]] = img.convert_alpha()
 
     def load_dir(self, dire):
         for i in glob.glob(dire+'*.gif'):
@@ -42,32 +77,92 @@ class ImageHandler(object):
                 img = pygame.image.load(i).convert_alpha()
                 self.images[short] = img
 
-    def set_flags(self):
-        player_flag = 'player-team-flag.png'
-        colors = [(255,0,0), (0,255,0), (0,0,255),
-                  (255,255,0), (255,0,255), (0,255,255)]
+    def recolor(self, name, color):
+        """Copy of image name with its team_key pixels turned to color,
+           made once per (name, color)"""
+        key = (name, tuple(color[:3]))
+        if not key in self.recolored:
+            img = self.images[name]
+            if isinstance(img, GIFImage.GIFImage):
+                new = img.copy()
+                for frame in new.frames:
+                    frame[0] = color_swap(frame[0].copy(), team_key, color)
+            else:
+                new = color_swap(img.copy(), team_key, color)
+            self.recolored[key] = new
+        return self.recolored[key]
+
+    def get_team_image(self, name, team):
+        """Return the name of image name in team's colour (team being an
+           index into team_colors), adding it to images. If name is not
+           loaded yet it is made by set_flags once it is"""
+        key = name+str(team)
+        if not key in self.images:
+            if name in self.images:
+                color = team_colors[team%len(team_colors)]
+                self.images[key] = self.recolor(name, color)
+            else:
+                self.wanted.add((name, team))
+        return key
 
-        for i in xrange(6):
-            new = self.images[player_flag].copy()
-            self.images[player_flag+str(i)] = color_swap(new,
-                                                         (127,127,127),
-                                                         colors[i])
+    def set_flags(self):
+        """Make the team flags and any team images asked for while loading"""
+        for i in xrange(len(team_colors)):
+            self.get_team_image('player-team-flag.png', i)
+        wanted = self.wanted
+        self.wanted = set()
+        for name, team in wanted:
+            self.get_team_image(name, team)
 
 class MapEntity(object):
+    _pos = (0,0)
+    _tile = None
+    _bound_to = None
+    in_chunks = False
+    followers = ()
     def __init__(self, parent, image, pos=(0,0), name='', render_pos='real'):
         self.parent = parent
         self.image = image
-        self.pos = (0,0)
-        self.move(*pos)
-        self.parent.entities.append(self)
         self.name = name
         self.render_pos = render_pos
         self.dead = False
+        self.followers = [] #entities bound to us
         self.bound_to = None
+        self.pos = (0,0)
+        self.move(*pos)
+        self.parent.add_entity(self)
     def kill(self):
         if self in self.parent.entities:
-            self.parent.entities.remove(self)
+            self.parent.remove_entity(self)
             self.dead = True
+        for i in list(self.followers):
+            i.kill()
+
+    def _get_bound_to(self):
+        return self._bound_to
+    def _set_bound_to(self, ent):
+        """Bound entities (team flags) follow ent around and die with it"""
+        if self._bound_to:
+            self._bound_to.followers.remove(self)
+        self._bound_to = ent
+        if ent:
+            ent.followers.append(self)
+            self.pos = ent.pos[0]-0.01, ent.pos[1]
+    bound_to = property(_get_bound_to, _set_bound_to)
+
+    def _get_pos(self):
+        return self._pos
+    def _set_pos(self, pos):
+        #re-adding keeps the chunk's draw order right
+        if self.in_chunks:
+            self.parent.chunks.remove_entity(self, self._tile)
+        self._pos = pos
+        self._tile = int(pos[0]), int(pos[1])
+        if self.in_chunks:
+            self.parent.chunks.add_entity(self, self._tile)
+        for i in self.followers:
+            i.pos = pos[0]-0.01, pos[1] #just in front of us
+    pos = property(_get_pos, _set_pos)
 
     def get_real_pos(self):
         cx,cy = self.parent.engine.camera.get_shift_pos()
@@ -93,23 +188,18 @@ class MapEntity(object):
         if self.parent.map_grid:
             if x < 0:
                 x = 0
-            if x >= len(self.parent.map_grid[0]):
-                x = len(self.parent.map_grid[0])
+            if x >= self.parent.width:
+                x = self.parent.width
 
             if y < 0:
                 y = 0
-            if y >= len(self.parent.map_grid):
-                y = len(self.parent.map_grid)
+            if y >= self.parent.height:
+                y = self.parent.height
 
         self.pos = (x,y)
 
-    def render(self):
-        if self.bound_to:
-            x, y = self.bound_to.pos
-            x -= 0.01
-            self.pos = x,y
-            if self.bound_to.dead:
-                self.kill()
+    def get_rect(self):
+        """Screen rect the image covers"""
         image = self.parent.images.images[self.image]
         r = image.get_rect()
         x, y = self.get_real_pos()
@@ -119,49 +209,211 @@ class MapEntity(object):
             r.midbottom = x,y
         else: # 'real'
             r.topleft = x,y
-        
+        return r
+
+    def render(self, view=None):
+        """view is the screen rect, anything outside is skipped"""
+        image = self.parent.images.images[self.image]
+        r = self.get_rect()
+        if view and not view.colliderect(r):
+            return
+
         try:
             image.render(self.parent.screen, r)
         except:
             self.parent.screen.blit(image, r)
 
-class MapHighlight(MapEntity):
-    def __init__(self, parent, image, pos=(0,0)):
+class HighlightLayer(object):
+    """Highlighted tiles, as tile:image name, plus the mouse hover tile.
+       Nothing is drawn from scratch - the screen positions are worked out
+       again only when the highlights change or the camera moves"""
+    def __init__(self, parent):
         self.parent = parent
-        self.image = image
-        self.pos = (0,0)
-        self.move(*pos)
-        self.parent.highlights.append(self)
-        self.render_pos = 'real'
-        self.bound_to = None
-
-    def kill(self):
-        if self in self.parent.highlights:
-            self.parent.highlights.remove(self)
+        self.tiles = {}
+        self.hover = None #(tile, image)
+        self.dirty = True
+
+        self.blits = []
+        self.built_for = None #(camera shift, area) the blits are for
+
+    def set(self, tile, image):
+        if self.tiles.get(tile) != image:
+            self.tiles[tile] = image
+            self.dirty = True
+
+    def set_tiles(self, tiles, image):
+        """Replace every highlight with image on tiles"""
+        tiles = dict((i, image) for i in tiles)
+        if tiles != self.tiles:
+            self.tiles = tiles
+            self.dirty = True
+
+    def set_hover(self, tile, image):
+        hover = (tile, image) if tile else None
+        if hover != self.hover:
+            self.hover = hover
+            self.dirty = True
+
+    def clear(self):
+        if self.tiles or self.hover:
+            self.tiles = {}
+            self.hover = None
+            self.dirty = True
+
+    def build(self, shift, area):
+        cx, cy = shift
+        tw, th = self.parent.tile_size
+        x0, y0, x1, y1 = area
+        images = self.parent.images.images
+        tiles = self.tiles.items()
+        if self.hover:
+            tiles.append(self.hover)
+        tiles.sort(key=lambda i: (i[0][1], -i[0][0]))
+
+        self.blits = []
+        for (x, y), image in tiles:
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                self.blits.append((images[image],
+                                   (int(cx + x*tw*0.5 + y*tw*0.5),
+                                    int(cy - x*th*0.5 + y*th*0.5))))
+        self.built_for = shift, area
+        self.dirty = False
+
+    def get_dirty_rects(self, shift, area):
+        """Screen rects of the highlights that changed, before and after"""
+        if not self.dirty and self.built_for == (shift, area):
+            return []
+        old = [pygame.Rect(pos, image.get_size()) for image, pos in self.blits]
+        self.build(shift, area)
+        return old + [pygame.Rect(pos, image.get_size()) for image, pos in self.blits]
+
+    def render(self, area):
+        shift = self.parent.engine.camera.get_shift_pos()
+        if self.dirty or self.built_for != (shift, area):
+            self.build(shift, area)
+        screen = self.parent.screen
+        for image, pos in self.blits:
+            if isinstance(image, GIFImage.GIFImage):
+                image.render(screen, pos)
+            else:
+                screen.blit(image, pos)
 
 class MapHandler(object):
+    tile_cache_size = 32 #pre-rendered chunk layers kept around
     def __init__(self, engine):
         self.tiles = {}
-        self.map_grid = []
         self.engine = engine
         self.screen = engine.screen
         self.images = engine.images
         self.entities = []
+        self.map_grid = []
+
+        self.highlights = HighlightLayer(self)
 
-        self.highlights = []
+        self.drawn = {} #entity:(rect, image, frame) as of get_dirty_rects
+        self.drawn_shift = None
+        self.redraw_all = True
 
         self.tile_size = tile_size
 
-    def sort_entities(self, a, b):
-        if a.pos[1] < b.pos[1]:
-            return -1
-        elif b.pos[1] < a.pos[1]:
-            return 1
-        elif a.pos[0] < b.pos[0]:
-            return 1
-        elif b.pos[0] < a.pos[0]:
-            return -1
-        return -1
+    def _get_map_grid(self):
+        return self._map_grid
+    def _set_map_grid(self, grid):
+        """Setting the grid (a list of rows) rebuilds the chunks"""
+        self._map_grid = grid
+        self.height = len(grid)
+        if grid:
+            self.width = len(grid[0])
+        else:
+            self.width = 0
+        self.chunks = chunked_map.ChunkedMap(self.width, self.height)
+        self.chunks.load_grid(grid)
+        for i in self.entities:
+            self.chunks.add_entity(i, i.get_my_tile())
+        self.clear_tile_cache()
+    map_grid = property(_get_map_grid, _set_map_grid)
+
+    def clear_tile_cache(self):
+        """Drop every pre-rendered ground layer - call after changing tiles"""
+        self.tile_cache = {} #(cx, cy):(surface, offset)
+        self.tile_cache_used = {} #(cx, cy):frame last drawn
+        self.frame = 0
+        self.redraw_all = True
+
+    def build_chunk_layer(self, chunk):
+        """Pre-render the ground tiles of chunk into one surface.
+           Returns (surface, offset) - offset is from the screen position
+           of the chunk's first tile to the surface corner"""
+        tw, th = self.tile_size
+        images = self.images.images
+        s = chunk.size
+        x0, y0, x1, y1 = chunk.get_area()
+        oy = (s-1)*th*0.5 #first tile sits half way down the layer
+        blits = []
+        w = h = 1
+        for i, col in enumerate(chunk.tiles):
+            c = i%s
+            r = i/s
+            if x0+c >= self.width or y0+r >= self.height:
+                continue
+            img = images[self.tiles[col]]
+            pos = int((c+r)*tw*0.5), int(oy + (r-c)*th*0.5)
+            blits.append((img, pos))
+            w = max(w, pos[0]+img.get_width())
+            h = max(h, pos[1]+img.get_height())
+
+        layer = pygame.Surface((w, h), SRCALPHA)
+        for img, pos in blits:
+            layer.blit(img, pos)
+        if pygame.display.get_surface():
+            layer = layer.convert_alpha()
+        return layer, (0, -oy)
+
+    def get_chunk_layer(self, chunk):
+        key = chunk.cx, chunk.cy
+        if chunk.dirty or not key in self.tile_cache:
+            self.tile_cache[key] = self.build_chunk_layer(chunk)
+            chunk.dirty = False
+        self.tile_cache_used[key] = self.frame
+        return self.tile_cache[key]
+
+    def trim_tile_cache(self):
+        """Forget the layers that have been off screen longest"""
+        extra = len(self.tile_cache) - self.tile_cache_size
+        if extra <= 0:
+            return
+        old = sorted(self.tile_cache_used.items(), key=lambda x: x[1])
+        for key, frame in old[:extra]:
+            if frame == self.frame:
+                break
+            del self.tile_cache[key]
+            del self.tile_cache_used[key]
+
+    def set_tile(self, x, y, val):
+        self._map_grid[y][x] = val
+        self.chunks.set_tile(x, y, val)
+        self.redraw_all = True
+
+    def add_entity(self, ent):
+        self.entities.append(ent)
+        self.chunks.add_entity(ent, ent.get_my_tile())
+        ent.in_chunks = True
+
+    def remove_entity(self, ent):
+        self.entities.remove(ent)
+        self.chunks.remove_entity(ent, ent.get_my_tile())
+        ent.in_chunks = False
+
+    def fill_entities(self, value, image, name='', render_pos='bottom'):
+        """Put an entity on every tile of the grid set to value"""
+        for y, row in enumerate(self._map_grid):
+            for x, val in enumerate(row):
+                if val == value:
+                    self.make_entity(image, (x,y), name, render_pos)
+
+    def get_blocking_tiles(self):
+        """Set of every tile with a 'blocking' entity on it"""
+        return self.chunks.blocking
 
     def make_entity(self, image, pos, name='', render_pos='bottom'):
         return MapEntity(self, image, map(int, pos), name, render_pos)
@@ -174,37 +426,111 @@ class MapHandler(object):
             self.engine.failed = True
 
     def add_highlight(self, image, pos):
-        return MapHighlight(self, image, (pos[0], pos[1]))
+        self.highlights.set(tuple(map(int, pos)), image)
+    def set_highlights(self, tiles, image):
+        """Highlight tiles (the ones in bounds) with image, and nothing else"""
+        self.highlights.set_tiles([i for i in tiles if self.in_bounds(i)], image)
+    def set_hover(self, tile, image='gui_mouse-hover2.png'):
+        """Highlight the tile under the mouse - None for none"""
+        self.highlights.set_hover(tile, image)
     def clear_highlights(self):
-        self.highlights = []
+        self.highlights.clear()
 
-    def render(self):
-        r = 0
+    def get_visible_area(self, margin=4):
+        """Tile area (x0, y0, x1, y1) that can show on screen, inclusive.
+           margin leaves room for images taller than a tile"""
+        cx, cy = self.engine.camera.get_shift_pos()
         tw, th = self.tile_size
-        for row in self.map_grid:
-            c = 0
-            for col in row:
-                cx, cy = self.engine.camera.get_shift_pos()
-                self.screen.blit(self.images.images[self.tiles[col]],
-                                 (cx + c*tw*0.5 + r*tw*0.5,
-                                  cy - c*th*0.5 + r*th*0.5))
-                c += 1
-            r += 1
-
-        for i in self.highlights:
-            i.render()
-
-        self.entities.sort(self.sort_entities)
-        for i in self.entities:
-            i.render()
+        if self.screen:
+            sw, sh = self.screen.get_size()
+        else:
+            sw, sh = 640, 480
+        xs = []
+        ys = []
+        for sx, sy in ((0,0), (sw,0), (0,sh), (sw,sh)):
+            a = (sx-cx)/(tw*0.5)
+            b = (sy-cy)/(th*0.5)
+            xs.append((a-b)*0.5)
+            ys.append((a+b)*0.5)
+        return (int(floor(min(xs)))-margin, int(floor(min(ys)))-margin,
+                int(max(xs))+margin, int(max(ys))+margin)
+
+    def get_entity_state(self, ent):
+        image = self.images.images[ent.image]
+        if isinstance(image, GIFImage.GIFImage):
+            frame = image.get_frame()
+        else:
+            frame = 0
+        return ent.get_rect(), ent.image, frame
+
+    def get_dirty_rects(self):
+        """Screen rects that look different since the last call, or None
+           when the whole screen does (the camera moved, tiles changed).
+           Entities are compared by rect, image and animation frame"""
+        shift = self.engine.camera.get_shift_pos()
+        area = self.get_visible_area()
+        x0, y0, x1, y1 = area
+        chunks = self.chunks.get_chunks_in(area)
+
+        drawn = {}
+        for i in self.chunks.draw_order(chunks):
+            x, y = i.pos
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                drawn[i] = self.get_entity_state(i)
+        full = self.redraw_all or shift != self.drawn_shift
+        for chunk in chunks:
+            if chunk.dirty:
+                full = True
+        old = self.drawn
+        self.drawn = drawn
+        self.drawn_shift = shift
+        self.redraw_all = False
+
+        rects = self.highlights.get_dirty_rects(shift, area)
+        if full:
+            return None
+        for ent, state in drawn.iteritems():
+            was = old.pop(ent, None)
+            if was != state:
+                rects.append(state[0])
+                if was:
+                    rects.append(was[0])
+        for was in old.itervalues(): #gone or off screen
+            rects.append(was[0])
+        return rects
+
+    def render(self, view=None):
+        """Draw the map, view limits it to that screen rect -
+           clip the screen to it as well"""
+        tw, th = self.tile_size
+        cx, cy = self.engine.camera.get_shift_pos()
+        area = self.get_visible_area()
+        x0, y0, x1, y1 = area
+        if not view:
+            view = self.screen.get_rect()
+        chunks = self.chunks.get_chunks_in(area)
+        profiler.begin('map')
+        self.frame += 1
+        for chunk in chunks:
+            layer, (dx, dy) = self.get_chunk_layer(chunk)
+            c, r = chunk.get_area()[:2]
+            self.screen.blit(layer, (cx + c*tw*0.5 + r*tw*0.5 + dx,
+                                     cy - c*th*0.5 + r*th*0.5 + dy))
+        self.trim_tile_cache()
+
+        self.highlights.render(area)
+        profiler.end('map')
+
+        profiler.begin('entities')
+        for i in self.chunks.draw_order(chunks):
+            x, y = i.pos
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                i.render(view)
+        profiler.end('entities')
 
     def in_bounds(self, pos):
         xx, yy = pos
-        if self.map_grid:
-            if xx >= 0 and xx < len(self.map_grid[0]) and\
-               yy >= 0 and yy < len(self.map_grid):
-                return True
-        return False
+        return 0 <= xx < self.width and 0 <= yy < self.height
 
     def get_mouse_tile(self):
         mx, my = pygame.mouse.get_pos()
@@ -219,12 +545,7 @@ class MapHandler(object):
         return None
 
     def get_entities_on_tile(self, x, y):
-        n = []
-        for i in self.entities:
-            a, b = i.get_my_tile()
-            if a==x and b==y:
-                n.append(i)
-        return n
+        return self.chunks.get_entities_on_tile(x, y)
 
 class Camera(object):
     def __init__(self, engine):
@@ -250,13 +571,13 @@ class Camera(object):
         if self.engine.mapd:
             if x < 0:
                 x = 0
-            if x >= len(self.engine.mapd.map_grid[0]):
-                x = len(self.engine.mapd.map_grid[0])
+            if x >= self.engine.mapd.width:
+                x = self.engine.mapd.width
 
             if y < 0:
                 y = 0
-            if y >= len(self.engine.mapd.map_grid):
-                y = len(self.engine.mapd.map_grid)
+            if y >= self.engine.mapd.height:
+                y = self.engine.mapd.height
 
         self.pos = (x,y)
 
@@ -266,36 +587,61 @@ class Camera(object):
         if self.engine.mapd:
             if x < 0:
                 x = 0
-            if x >= len(self.engine.mapd.map_grid[0]):
-                x = len(self.engine.mapd.map_grid[0])
+            if x >= self.engine.mapd.width:
+                x = self.engine.mapd.width
 
             if y < 0:
                 y = 0
-            if y >= len(self.engine.mapd.map_grid):
-                y = len(self.engine.mapd.map_grid)
+            if y >= self.engine.mapd.height:
+                y = self.engine.mapd.height
 
         self.pos = (x,y)
 
 class GFXEngine(object):
-    def __init__(self, screen, scenario, client=None):
+    scenario_dir = 'data/scenarios/'
+    def __init__(self, screen, scenario, client=None, loader=None):
+        """loader is an optional asset_loader.AssetLoader - images are then
+           loaded in the background and the map is built as a loader step,
+           don't render until it is finished"""
         self.screen = screen
         self.scenario = scenario
         self.client = client
         self.failed = False
+        self.loader = loader
         self.load_images()
         self.mapd = None
         self.camera = Camera(self)
-        self.load_map()
+        if self.loader:
+            self.loader.add_step(self.load_map)
+        else:
+            self.load_map()
 
     def load_images(self):
         self.images = ImageHandler()
-        self.images.load_dir('data/scenarios/%s/images/'%self.scenario)
+        if self.loader:
+            self.images.queue_dir(self.scenario_dir+'%s/images/'%self.scenario, self.loader)
+            self.images.queue_dir('data/images/', self.loader)
+            self.loader.add_step(self.images.set_flags)
+            return
+        self.images.load_dir(self.scenario_dir+'%s/images/'%self.scenario)
         self.images.load_dir('data/images/')
         self.images.set_flags()
 
+    def get_team_image(self, name, team):
+        """Name of image name recoloured for team, see ImageHandler.get_team_image"""
+        if self.images:
+            return self.images.get_team_image(name, team)
+        return name+str(team)
+
     def load_map(self):
         self.mapd = MapHandler(self)
-        self.mapd.load_map_file('data/scenarios/%s/map.py'%self.scenario)
+        self.mapd.load_map_file(self.scenario_dir+'%s/map.py'%self.scenario)
+
+    def get_dirty_rects(self):
+        """Start a frame - moves the animations on and returns the screen
+           rects that need drawing, None for all of it (see MapHandler)"""
+        GIFImage.clock.tick()
+        return self.mapd.get_dirty_rects()
 
-    def render(self):
-        self.mapd.render()
+    def render(self, view=None):
+        self.mapd.render(view)
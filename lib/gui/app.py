@@ -12,17 +12,23 @@ class App(object):
 
         self.load_theme(None)
 
+        self.dirty_all = True
+        self.dirty_widgets = set()
+        self.drawn = {} #widget:rect it was last drawn at
+
     def load_theme(self, name, texture_handler=None, font_handler=None):
         th = theme.Theme(name, texture_handler, font_handler)
         th.load_data()
 
         self.theme = th.get_element_copy("App")
+        self.set_dirty()
 
     def update_theme(self, name):
         th = self.theme.main_theme
         th.update(name)
         self.theme = th.get_element_copy("App")
         self.update_child_theme()
+        self.set_dirty()
 
     def update_child_theme(self):
         for i in self.widgets:
@@ -43,6 +49,31 @@ class App(object):
     def add_widget(self, widg):
         if not widg in self.widgets:
             self.widgets.insert(0, widg)
+            self.set_dirty(widg)
+
+    def set_dirty(self, widg=None):
+        """Mark widg as needing a redraw - or everything, if widg is None"""
+        if widg is None:
+            self.dirty_all = True
+        else:
+            self.dirty_widgets.add(widg)
+
+    def get_dirty_rects(self):
+        """Return the screen rects to draw again since the last call -
+           where the changed widgets were drawn and where they are now.
+           Returns None when the whole gui has to be drawn."""
+        if self.dirty_all:
+            self.dirty_all = False
+            self.dirty_widgets = set()
+            return None
+        rects = []
+        for i in self.dirty_widgets:
+            if i in self.drawn:
+                rects.append(self.drawn[i])
+            if i in self.widgets and i.get_visible():
+                rects.append(i.get_rect_with_padding())
+        self.dirty_widgets = set()
+        return rects
 
     def handle_mousedown(self, button, name):
         """Callback for mouse click events from the event_handler."""
@@ -127,6 +158,7 @@ class App(object):
         if widg in self.widgets:
             self.widgets.remove(widg)
         self.widgets.insert(0, widg)
+        self.set_dirty(widg)
         for i in self.widgets:
             if i.get_visible():
                 if not i == widg:
@@ -160,9 +192,12 @@ class App(object):
             engine.draw.rect2d(pygame.Rect((0,0),  self.screen.screen_size_2d),
                                color, image)
 
+            self.drawn = {}
             self.widgets.reverse()
             for i in self.widgets:
-                if i.get_visible(): i.render()
+                if i.get_visible():
+                    i.render()
+                    self.drawn[i] = i.get_rect_with_padding()
             self.widgets.reverse()
 
     def am_active(self):
@@ -118,5 +118,6 @@ class Container(widget.Widget, app.App):
         for i in self.widgets:
             if i.get_visible(): i.render()
         self.widgets.reverse()
+        engine.batch.flush() #children were queued under the translate
         glPopMatrix()
         self.screen.pop_clip()
@@ -19,7 +19,7 @@ class DropDown(button.Button):
         self.turn_off()
 
     def turn_off(self):
-        self.child.theme.set_val('visible', False)
+        self.child.set_visible(False)
     def turn_off_vis(self):
         self.vis = False
     def turn_on(self):
@@ -28,5 +28,5 @@ class DropDown(button.Button):
             self.vis = False
             return
         self.vis = True
-        self.child.theme.set_val('visible', True)
+        self.child.set_visible(True)
         self.child.focus()
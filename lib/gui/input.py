@@ -5,6 +5,9 @@ from include import event
 
 class Input(widget.Widget):
     widget_type = "Input"
+
+    cursor_pos = widget.dirty_property('cursor_pos')
+    flashed = widget.dirty_property('flashed')
     def __init__(self, parent, pos, name=None):
         widget.Widget.__init__(self, parent, pos, name)
 
@@ -20,11 +20,11 @@ class PopUp(widget.Widget):
         self.theme.set_val('visible', False)
 
     def turn_on(self):
-        self.theme.set_val('visible', True)
+        self.set_visible(True)
         self.parent.add_widget(self)
         self.focus()
     def turn_off(self):
-        self.theme.set_val('visible', False)
+        self.set_visible(False)
         self.destroy()
 
     def unfocus(self):
@@ -89,7 +89,7 @@ class Theme(object):
         else:
             self.theme_name = theme
             if texture_handler == None:
-                self.textures = engine.helpers.TextureHandler()
+                self.textures = engine.helpers.TextureHandler(use_atlas=True)
             else:
                 self.textures = texture_handler
             if font_handler == None:
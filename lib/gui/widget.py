@@ -2,8 +2,36 @@ from include import *
 
 import misc, theme
 
+_unset = object()
+
+def dirty_property(name):
+    """An attribute that marks the widget dirty when set to something new -
+       for the ones that change how it looks"""
+    key = '_dirty_' + name
+    def get(self):
+        try:
+            return self.__dict__[key]
+        except KeyError:
+            raise AttributeError(name)
+    def set(self, value):
+        old = self.__dict__.get(key, _unset)
+        self.__dict__[key] = value
+        if old is not value and old != value:
+            self.set_dirty()
+    return property(get, set)
+
 class Widget(object):
     widget_type = "Widget"
+
+    pos = dirty_property('pos')
+    size = dirty_property('size')
+    text = dirty_property('text')
+    visible = dirty_property('visible')
+    theme = dirty_property('theme')
+    key_active = dirty_property('key_active')
+    _mhover = dirty_property('_mhover')
+    _mhold = dirty_property('_mhold')
+
     def __init__(self, parent, pos, name=None):
         self.widget_name = name
 
@@ -39,6 +67,13 @@ class Widget(object):
         self.double_click_dur = 0.1 #max seconds between clicks to register!
         self.dispatch.bind('click', self.test_double_click)
 
+    def set_dirty(self, widg=None):
+        """Tell the parent this widget needs drawing again.
+           Containers pass it on, so the App hears about the top widget."""
+        parent = self.__dict__.get('parent')
+        if parent is not None:
+            parent.set_dirty(self)
+
     def test_double_click(self):
         if self.last_click:
             if time.time() - self.last_click < self.double_click_dur:
@@ -51,7 +86,13 @@ class Widget(object):
         self.theme = self.parent.theme.get_element_copy(self.widget_type,
                                                         self.widget_name)
 
+    def set_visible(self, value):
+        """Show or hide the widget, through its theme"""
+        self.theme.set_val('visible', value)
+        self.set_dirty()
+
     def destroy(self):
+        self.set_dirty()
         if self in self.parent.widgets:
             self.parent.widgets.remove(self)
 
@@ -0,0 +1,79 @@
+"""Run a scenario without a window - for benchmarks and AI testing.
+
+HeadlessGame stands in for in_game.Game (and the GameEngine behind it):
+the map, units, abilities and AI are the real ones, only rendering, gui
+and networking are left out."""
+
+import gfx_engine, mod_base
+
+class Label(object):
+    """gui.Label stand in - keeps the attributes, draws nothing"""
+    def __init__(self, parent, pos, text, name=None):
+        self.parent = parent
+        self.pos = pos
+        self.text = text
+        self.name = name
+        self.visible = True
+
+class HeadlessGUI(object):
+    """What scenario.py gets as 'gui' when running headless"""
+    Label = Label
+
+class GFXEngine(gfx_engine.GFXEngine):
+    """Map and camera only, no images or screen"""
+    def __init__(self, scenario, scenario_dir='data/scenarios/', options=None):
+        self.scenario_dir = scenario_dir
+        self.options = options or {}
+        gfx_engine.GFXEngine.__init__(self, None, scenario)
+
+    def load_images(self):
+        self.images = None
+
+    def render(self):
+        pass
+
+class HeadlessGame(object):
+    """Plays a scenario with AI players on every team.
+       options is a dict handed to the scenario as engine.options - map.py
+       sees it as gfx_engine.options"""
+    def __init__(self, scenario, scenario_dir='data/scenarios/', options=None):
+        self.options = options or {}
+        self.engine = self #scenarios reach the game engine through here
+        self.am_master = True
+        self.whos_turn = ''
+        self.app = None
+        self.turn_over = False
+        self.messages = []
+
+        self.gfx = GFXEngine(scenario, scenario_dir, self.options)
+        self.mod = mod_base.Scenario(self, scenario, scenario_dir,
+                                     HeadlessGUI)
+        self.mod.ai_time_budget = 1e9 #no frames to keep going headless
+
+        for team in self.mod.config.teams:
+            self.mod.make_ai_player(team)
+
+    # in_game.Game/GameEngine calls used by scenarios and AI
+    def setScenarioMess(self, mess, icon=None, button_name='Close'):
+        pass
+
+    def endMyTurn(self, *args):
+        self.turn_over = True
+
+    def sendMessage(self, message):
+        self.messages.append(message)
+
+    def start_turn(self, team):
+        self.whos_turn = team
+        self.turn_over = False
+        self.mod.set_turn(team)
+
+    def play_turn(self, team, max_frames=10000):
+        """Run frames until team's AI ends its turn, returns the winner
+           (or None)"""
+        self.start_turn(team)
+        frames = 0
+        while not self.turn_over and frames < max_frames:
+            self.mod.update()
+            frames += 1
+        return self.mod.winner()
@@ -1,13 +1,19 @@
-import gfx_engine, gui, mod_base, event
+import gfx_engine, gui, mod_base, event, asset_loader
+from profiler import profiler
 import pygame
 from pygame.locals import *
+import time
 
 class Game(object):
+    load_budget = 0.01 #seconds per frame spent finishing loaded images
+    max_dirty_rects = 8 #more than this are flipped as one
     def __init__(self, engine):
         self.engine = engine
         self.screen = engine.client.screen
 
-        self.gfx = gfx_engine.GFXEngine(engine.client.screen, engine.scenario)
+        self.loader = asset_loader.AssetLoader()
+        self.gfx = gfx_engine.GFXEngine(engine.client.screen, engine.scenario,
+                                        loader=self.loader)
 
         self.event_handler = event.Handler()
 
@@ -44,8 +50,8 @@ class Game(object):
 
         self.unit_info_sub = gui.Container(self.unit_info, (150,150), (0,0))
         self.unit_info_sub.bg_color = (0,0,0,0)
-        self.ui_icon = gui.Icon(self.unit_info_sub, (5,5), self.gfx.images.images.values()[0])
-        self.ui_icon2 = gui.Icon(self.unit_info_sub, (5,5), self.gfx.images.images.values()[0])
+        self.ui_icon = gui.Icon(self.unit_info_sub, (5,5))
+        self.ui_icon2 = gui.Icon(self.unit_info_sub, (5,5))
         self.ui_name = gui.Label(self.unit_info_sub, gui.RelativePos(to=self.ui_icon,x='right',y='top',padx=5,pady=25), 'Name')
         self.ui_hp = gui.Label(self.unit_info_sub, gui.RelativePos(to=self.ui_name, pady=5), 'HP: 10/10')
         self.ui_ap = gui.Label(self.unit_info_sub, gui.RelativePos(to=self.ui_hp, pady=5), 'AP: 10/10')
@@ -99,7 +105,7 @@ class Game(object):
         bg = gui.Container(self.scenario_mess, (630, 200), (5,100))
         bg.bg_color = (100,100,255,175)
 
-        self.scenario_mess_icon = gui.Icon(bg, (5, 5), self.gfx.images.images.values()[0])
+        self.scenario_mess_icon = gui.Icon(bg, (5, 5))
         self.scenario_mess_mess = gui.Label(bg,
                                             gui.RelativePos(to=self.scenario_mess_icon,
                                                             pady = 5),
@@ -125,20 +131,48 @@ class Game(object):
         self.select_action.visible = False
         self.select_action.bg_color = (100,100,100,255)
 
+        self.loading = gui.Label(self.app, (250, 230), 'Loading...')
+        self.loading.font = lil_font
+
         ###game code:
 
-        self.mod = mod_base.Scenario(self, engine.scenario)
+        #the scenario is built as a loader step too, after the map -
+        #anything that needs it before then waits in after_load
+        self.mod = None
+        self.loaded = False
+        self.after_load = []
+        self.loader.add_step(self.load_scenario)
 
         self.selected_unit = None
         self.selected_action = None
         self.control_highlight = False
-        self.event_handler.dispatch.bind('mouseup', self.handle_mouseup)
-        self.event_handler.dispatch.bind('keydown', self.handle_input_key)
 
         self.lock = False
         if not self.engine.whos_turn == self.engine.my_team:
             self.deactivate_commands()
 
+        self.redraw_all = True
+
+    def load_scenario(self):
+        self.mod = mod_base.Scenario(self, self.engine.scenario)
+        self.event_handler.dispatch.bind('mouseup', self.handle_mouseup)
+        self.event_handler.dispatch.bind('keydown', self.handle_input_key)
+
+    def when_loaded(self, func, *args):
+        """Call func(*args) now, or once loading is over if it isn't yet"""
+        if self.loaded:
+            func(*args)
+        else:
+            self.after_load.append((func, args))
+
+    def make_ai_player(self, team):
+        """Have the AI play team - once the scenario is loaded"""
+        self.when_loaded(lambda: self.mod.make_ai_player(team))
+
+    def redraw(self):
+        """Draw the whole screen next frame - call after changing the gui"""
+        self.redraw_all = True
+
     def closeScenarioMess(self):
         self.mod.closeScenarioMess()
         self.scenario_mess.visible = False
@@ -157,9 +191,8 @@ class Game(object):
         self.scenario_mess.focus()
 
     def set_turn(self, team):
-        for i in self.mod.units:
-            if i.team == team:
-                i.cur_ap = int(i.action_points)
+        self.mod.set_turn(team)
+        self.redraw_all = True
         if team == self.engine.my_team:
             self.activate_commands()
 
@@ -179,6 +212,12 @@ class Game(object):
         if key == K_RETURN:
             self.input_cont.visible = not self.input_cont.visible
             self.input_cont.focus()
+        elif key == K_F3:
+            profiler.toggle()
+        elif key == K_F4:
+            name = 'profile-%d.json'%time.time()
+            profiler.save_trace(name)
+            self.messages.add_line('<info>frame trace saved to '+name)
 
     def handle_action_sel(self, value, disabled):
         if disabled:
@@ -186,11 +225,7 @@ class Game(object):
 
         self.selected_action = value
         self.select_action.visible = False
-        act = None
-        for i in self.selected_unit.actions:
-            if i.desc == value:
-                act = i
-                break
+        act = self.selected_unit.get_action_by_desc(value)
         if act:
             self.selected_action = act
             self.selected_action.render_select()
@@ -205,7 +240,7 @@ class Game(object):
 
         if unit and unit.dead==False:
             self.unit_info_sub.visible = True
-            self.ui_icon.image = self.gfx.images.images[unit.image]
+            self.ui_icon.image = self.gfx.images.images[unit.gfx_entity.image]
             self.ui_icon2.image = self.gfx.images.images[unit.team_flag.image]
             self.ui_name.text = unit.name
             self.ui_hp.text = 'HP: %s/%s'%(unit.cur_hp, unit.hp)
@@ -298,17 +333,10 @@ class Game(object):
         self.lock = False
 
     def doAction(self, gid, action, target):
-        unit = None
-        for i in self.mod.units:
-            if i.gid == gid:
-                unit = i
-                break
-
+        unit = self.mod.get_unit(gid)
         act = None
-        for i in unit.actions:
-            if i.name == action:
-                act = i
-                break
+        if unit:
+            act = unit.get_action(action)
 
         if unit and act:
             act.perform(target)
@@ -322,9 +350,37 @@ class Game(object):
                 break
         if not good:
             self.select_action.visible = False
+        self.redraw_all = True
+
+    def update_loading(self):
+        """Keep drawing while images, the map and the scenario load,
+           returns True once they are all in"""
+        if self.loader.update(self.load_budget):
+            self.loader.close()
+            self.loading.visible = False
+            self.loaded = True
+            for func, args in self.after_load:
+                func(*args)
+            self.after_load = []
+            return True
+        done, total = self.loader.get_progress()
+        self.loading.text = 'Loading... %s/%s'%(done, total)
+        self.event_handler.update()
+        if self.event_handler.quit:
+            self.loader.cancel()
+            self.engine.client.engine.close_app() #sheesh!
+            return False
+        self.screen.fill((0,0,0))
+        self.app.render()
+        pygame.display.flip()
+        return False
 
     def update(self):
+        if self.loading.visible and not self.update_loading():
+            return
+        profiler.begin('mod')
         self.mod.update()#right up here at top before anything else!
+        profiler.end('mod')
         x = self.mod.winner()
         if x:
             self.engine.leaveGame(None)
@@ -355,7 +411,9 @@ class Game(object):
         if self.engine.whos_turn in self.engine.free_teams:
             self.ui_whos_turn.text += " <AI>"
 
+        profiler.begin('events')
         self.event_handler.update()
+        profiler.end('events')
         if self.event_handler.quit:
             self.engine.client.engine.close_app() #sheesh!
             return
@@ -374,12 +432,43 @@ class Game(object):
 
             #TODO: change this
             if not self.control_highlight:
-                xy = self.gfx.mapd.get_mouse_tile()
-                self.gfx.mapd.clear_highlights()
-                if xy:
-                    self.gfx.mapd.add_highlight('gui_mouse-hover2.png', xy)
+                self.gfx.mapd.set_hover(self.gfx.mapd.get_mouse_tile())
+
+        self.render()
+
+    def render(self):
+        """Redraw only what changed - the map and the gui widgets track
+           their own dirty rects, everything is drawn once clipped to the
+           union of them. Frames where nothing changed are skipped"""
+        rects = self.gfx.get_dirty_rects()
+        gui_rects = self.app.get_dirty_rects()
+        if rects is None or gui_rects is None or self.redraw_all or \
+               profiler.show:
+            self.redraw_all = False
+            self.screen.fill((0,0,0))
+            self.gfx.render()
+            profiler.begin('gui')
+            self.app.render()
+            profiler.end('gui')
+            profiler.render_overlay(self.screen)
+            profiler.begin('flip')
+            pygame.display.flip()
+            profiler.end('flip')
+            return
 
-        self.screen.fill((0,0,0))
-        self.gfx.render()
+        rects = rects + gui_rects
+        if not rects:
+            return
+        clip = rects[0].unionall(rects[1:])
+        if len(rects) > self.max_dirty_rects:
+            rects = [clip]
+        self.screen.set_clip(clip)
+        self.screen.fill((0,0,0), clip)
+        self.gfx.render(clip)
+        profiler.begin('gui')
         self.app.render()
-        pygame.display.flip()
+        profiler.end('gui')
+        self.screen.set_clip(None)
+        profiler.begin('flip')
+        pygame.display.update(rects)
+        profiler.end('flip')
@@ -1,10 +1,15 @@
-
+import os
 
 class ReturnVals(object):
     def __init__(self):
         pass
 
-def load(path, access={}):
+def load(path, access=None):
+    """Run the mod at path with access as its globals - plus __file__,
+       so it can find the files next to it"""
+    if access is None:
+        access = {}
+    access['__file__'] = os.path.abspath(path)
 ##    try:
 ##        ret_val = ReturnVals()
 ##        eval(compile(open(path, 'rU').read(), '<%s>'%path, 'exec'),
@@ -1,5 +1,6 @@
-import load_mod_file, gui
-import glob, os
+import load_mod_file, gui, pathing, ai_search
+import glob, os, time, types
+import numpy
 from math import sqrt, sin, cos, pi
 
 class Ability(object):
@@ -29,6 +30,15 @@ class Ability(object):
     def get_select(self):
         pass
 
+    def get_sim_spec(self):
+        '''Describe the ability for the search AI, or None if it can't
+           be simulated. Returns (kind, reach, damage, cost):
+               kind is 'move' or 'attack'
+               reach is the max tiles (in any direction) an attack hits
+               damage is the multiplier of unit strength dealt
+               cost is the AP used - None uses all AP'''
+        return None
+
 class AbilityHandler(object):
     def __init__(self):
         self.abilities = {}
@@ -44,11 +54,103 @@ class AbilityHandler(object):
             else:
                 self.abilities[name] = store.ability
 
+class UnitTable(object):
+    '''Struct of arrays store for the battle state of every unit.
+       Each unit owns one row, columns are numpy arrays so team/alive
+       queries, AP resets and win checks are single array operations.
+           x, y - tile position
+           hp, ap - current hit/action points
+           max_ap - action points restored each turn
+           team - team id (see team_id), no_team until one is set
+           alive - False once the unit is dead'''
+    no_team = -1
+    def __init__(self, size=64):
+        self.units = []
+        self.team_ids = {}
+        self.team_names = []
+
+        self.size = 0
+        self.x = numpy.zeros(size, 'i')
+        self.y = numpy.zeros(size, 'i')
+        self.hp = numpy.zeros(size, 'i')
+        self.ap = numpy.zeros(size, 'i')
+        self.max_ap = numpy.zeros(size, 'i')
+        self.team = numpy.zeros(size, 'h')
+        self.alive = numpy.zeros(size, bool)
+
+    def _grow(self):
+        new = max(len(self.x)*2, 1)
+        for name in ('x', 'y', 'hp', 'ap', 'max_ap', 'team', 'alive'):
+            old = getattr(self, name)
+            col = numpy.zeros(new, old.dtype)
+            col[:len(old)] = old
+            setattr(self, name, col)
+
+    def add(self, unit):
+        '''Give unit a row, returns the row index'''
+        if self.size >= len(self.x):
+            self._grow()
+        row = self.size
+        self.size += 1
+        self.units.append(unit)
+        self.alive[row] = True
+        self.team[row] = self.no_team
+        return row
+
+    def team_id(self, name):
+        if not name in self.team_ids:
+            self.team_ids[name] = len(self.team_names)
+            self.team_names.append(name)
+        return self.team_ids[name]
+
+    def mask(self, team=None, enemy_of=None, alive=True):
+        '''Boolean array of the rows matching every given filter'''
+        n = self.size
+        m = numpy.ones(n, bool)
+        if alive is not None:
+            m &= self.alive[:n] == alive
+        #lookups don't register teams, unknown ones just have no units
+        if team is not None:
+            if not team in self.team_ids:
+                return numpy.zeros(n, bool)
+            m &= self.team[:n] == self.team_ids[team]
+        if enemy_of is not None:
+            col = self.team[:n]
+            m &= col != self.team_ids.get(enemy_of, self.no_team)
+            m &= col != self.no_team
+        return m
+
+    def select(self, team=None, enemy_of=None, alive=True):
+        units = self.units
+        return [units[i] for i in numpy.flatnonzero(self.mask(team, enemy_of, alive))]
+
+    def count(self, team=None, enemy_of=None, alive=True):
+        return int(numpy.count_nonzero(self.mask(team, enemy_of, alive)))
+
+    def positions(self, team=None, enemy_of=None, alive=True):
+        '''Return a set of the (x, y) tiles of the matching units'''
+        rows = numpy.flatnonzero(self.mask(team, enemy_of, alive))
+        return set(zip(self.x[rows].tolist(), self.y[rows].tolist()))
+
+    def reset_ap(self, team):
+        m = self.mask(team, alive=None)
+        self.ap[:self.size][m] = self.max_ap[:self.size][m]
+
 class Unit(object):
+    '''A thin view over one row of the scenario's UnitTable -
+       pos, cur_hp, cur_ap, action_points, team and dead live in the table.
+       Mod units should set __slots__ = () to stay dict free.'''
+    __slots__ = ('scenario', 'row', 'gid',
+                 'name', 'level', 'image', 'gfx_entity', 'team_flag', 'desc',
+                 'boost_hp', 'boost_strength', 'hp', 'strength',
+                 'base_stats', 'abilities', 'actions',
+                 'actions_by_name', 'actions_by_desc')
     type = 'base'
+    team_colored = False #image has team_key pixels to paint in the team colour
     last_gid = 0
     def __init__(self, scenario):
         self.scenario = scenario
+        self.row = scenario.table.add(self)
 
         # Gfx Attributes
         self.name = ''
@@ -71,17 +173,84 @@ class Unit(object):
         self.base_stats = {}
         self.abilities = self.scenario.abilh.abilities
         self.actions = []
+        self.actions_by_name = {}
+        self.actions_by_desc = {}
 
         self.initialize()
 
         self.gid = self.last_gid
         Unit.last_gid += 1
 
+    # Table backed attributes
+    def _get_pos(self):
+        t = self.scenario.table
+        return int(t.x[self.row]), int(t.y[self.row])
+    def _set_pos(self, pos):
+        t = self.scenario.table
+        old = int(t.x[self.row]), int(t.y[self.row])
+        t.x[self.row], t.y[self.row] = pos
+        if old != tuple(pos):
+            self.scenario.fire('on_unit_moved', self, old, self.pos)
+    pos = property(_get_pos, _set_pos)
+
+    def _get_cur_hp(self):
+        return int(self.scenario.table.hp[self.row])
+    def _set_cur_hp(self, val):
+        self.scenario.table.hp[self.row] = val
+    cur_hp = property(_get_cur_hp, _set_cur_hp)
+
+    def _get_cur_ap(self):
+        return int(self.scenario.table.ap[self.row])
+    def _set_cur_ap(self, val):
+        self.scenario.table.ap[self.row] = val
+    cur_ap = property(_get_cur_ap, _set_cur_ap)
+
+    def _get_action_points(self):
+        return int(self.scenario.table.max_ap[self.row])
+    def _set_action_points(self, val):
+        self.scenario.table.max_ap[self.row] = val
+    action_points = property(_get_action_points, _set_action_points)
+
+    def _get_team(self):
+        t = self.scenario.table
+        tid = t.team[self.row]
+        if tid == t.no_team:
+            return ''
+        return t.team_names[tid]
+    def _set_team(self, name):
+        t = self.scenario.table
+        if name:
+            t.team[self.row] = t.team_id(name)
+        else:
+            t.team[self.row] = t.no_team #placeholder, not a team
+    team = property(_get_team, _set_team)
+
+    def _get_dead(self):
+        return not self.scenario.table.alive[self.row]
+    def _set_dead(self, val):
+        t = self.scenario.table
+        was_alive = t.alive[self.row]
+        t.alive[self.row] = not val
+        if val and was_alive:
+            self.scenario.fire('on_unit_died', self)
+    dead = property(_get_dead, _set_dead)
+
     def initialize(self):
         pass
 
     def have_ability(self, name):
-        self.actions.append(self.abilities[name](self))
+        new = self.abilities[name](self)
+        self.actions.append(new)
+        #first one wins, same as scanning actions did
+        self.actions_by_name.setdefault(new.name, new)
+        self.actions_by_desc.setdefault(new.desc, new)
+
+    def get_action(self, name):
+        '''Return our ability called name, or None'''
+        return self.actions_by_name.get(name)
+
+    def get_action_by_desc(self, desc):
+        return self.actions_by_desc.get(desc)
 
     def load_stats(self, stats):
         self.name, self.pos, self.level = stats
@@ -118,11 +287,46 @@ class AI(object):
         self.scenario = scenario
         self.team = team
 
+        self._turn = None
+        self._turn_done = False
+
         self.initialize()
 
     def initialize(self):
         pass
 
+    def update(self):
+        '''Play the turn. Can either do everything at once, or be a
+           generator that yields between actions - then the turn is spread
+           over several frames and the game keeps running while we think.'''
+        self.end_my_turn()
+
+    def run_turn(self, budget):
+        '''Advance this AI's turn for at most budget seconds'''
+        if self._turn_done:
+            return
+        if self._turn is None:
+            ret = self.update()
+            if not isinstance(ret, types.GeneratorType):
+                self._turn_done = True
+                return
+            self._turn = ret
+
+        end = time.time() + budget
+        try:
+            while True:
+                self._turn.next()
+                if time.time() >= end:
+                    break
+        except StopIteration:
+            self._turn = None
+            self._turn_done = True
+
+    def reset_turn(self):
+        '''Called while it is not our turn - so the next one starts fresh'''
+        self._turn = None
+        self._turn_done = False
+
     def end_my_turn(self):
         self.scenario.engine.endMyTurn()
         self.scenario.engine.engine.sendMessage('<AI> I end turn')
@@ -131,18 +335,58 @@ class AI(object):
         action.perform(target)
     
     def get_my_units(self):
-        bucket = []
-        for u in self.scenario.units:
-            if u.team == self.team and u.dead == False:
-                bucket.append(u)
-        return bucket
+        return self.scenario.table.select(team=self.team)
 
     def get_enemy_units(self):
-        bucket = []
-        for u in self.scenario.units:
-            if u.team != self.team and u.dead == False:
-                bucket.append(u)
-        return bucket
+        return self.scenario.table.select(enemy_of=self.team)
+
+    def get_goals(self, unit):
+        '''Tiles unit wants to get to - defaults to every enemy'''
+        return [u.pos for u in self.get_enemy_units()]
+
+    # Turn planning - shared data built once per turn
+    def begin_turn(self):
+        '''Reset the per turn planning cache.
+           Call at the start of update, fields are reused by every unit.'''
+        mapd = self.scenario.engine.gfx.mapd
+        self.map_size = (mapd.width, mapd.height)
+        self.walls = set(mapd.get_blocking_tiles())
+        self.fields = {}
+
+    def get_enemy_tiles(self):
+        return self.scenario.table.positions(enemy_of=self.team)
+
+    def get_distance_field(self, sources):
+        '''Return a DistanceField to the sources, walking around walls
+           and enemy units. Fields are cached until the sources or enemy
+           positions change.'''
+        enemies = self.get_enemy_tiles()
+        key = (tuple(sorted(sources)), tuple(sorted(enemies)))
+        if not key in self.fields:
+            w, h = self.map_size
+            self.fields[key] = pathing.DistanceField(w, h, sources,
+                                                     self.walls|enemies)
+        return self.fields[key]
+
+    def get_reachable(self, unit, budget):
+        '''Return {tile:steps} for the tiles unit could move to this action'''
+        w, h = self.map_size
+        friends = self.scenario.table.positions(team=self.team)
+        friends.discard(unit.pos)
+        return pathing.reachable_tiles(unit.pos, budget, w, h,
+                                       self.walls|self.get_enemy_tiles(),
+                                       friends)
+
+    def get_best_move(self, unit, field, budget):
+        '''Return the reachable tile that gets unit closest to the field
+           sources, or None if it can't get any closer'''
+        here = field.get(unit.pos)
+        tile = field.best_of(self.get_reachable(unit, budget))
+        if tile is None:
+            return None
+        if here is not None and field.get(tile) >= here:
+            return None
+        return tile
 
     # Path search utility functions
     def distance(self, a, b):
@@ -153,32 +397,92 @@ class AI(object):
             yield (int(cos(i*0.5*pi)+x[0]),
                    int(sin(i*0.5*pi)+x[1]))
 
+class SearchAI(AI):
+    '''AI that plans the whole turn with a lookahead search (ai_search)
+       instead of greedy one step rules. Thinks for at most time_limit
+       seconds, spread over frames, then plays the best line found.'''
+    time_limit = 1.0
+    beam_width = 8
+    max_moves = 6
+
+    def make_sim_state(self):
+        self.begin_turn()
+        units = self.get_my_units()
+        goals = []
+        if units:
+            goals = self.get_goals(units[0])
+        state = ai_search.SimState(self.map_size, self.walls,
+                                   {self.team:goals})
+        for u in self.scenario.units:
+            if u.dead:
+                continue
+            specs = []
+            for n, a in enumerate(u.actions):
+                spec = a.get_sim_spec()
+                if spec:
+                    specs.append((n, spec))
+            state.add_unit(u.gid, u.team, u.pos, u.cur_hp, u.cur_ap,
+                           u.strength, specs)
+        return state
+
+    def update(self):
+        state = self.make_sim_state()
+        search = ai_search.Search(state, self.team, self.time_limit,
+                                  self.beam_width, self.max_moves)
+        while not search.step():
+            yield None
+
+        for i, act in search.line:
+            index, target = act
+            u = self.scenario.get_unit(state.gids[i])
+            if u.dead:
+                continue
+            self.do_action(u, u.actions[index], target)
+            yield None
+        self.end_my_turn()
+
 class BaseScenario(object):
     def __init__(self, engine):
         self.engine = engine
         self.initialize()
 
     def winner(self):
+        '''Only called after something changed (see the on_* hooks)'''
         return False
 
+    # Simulation hooks - fired when the game state changes
+    def on_unit_moved(self, unit, old, new):
+        pass
+
+    def on_unit_died(self, unit):
+        pass
+
+    def on_turn_changed(self, team):
+        pass
+
     def closeScenarioMess(self):
         pass
 
 class Scenario(object):
-    def __init__(self, engine, scenario):
+    def __init__(self, engine, scenario, scenario_dir='data/scenarios/',
+                 gui_lib=gui):
+        '''gui_lib is the gui module handed to scenario.py - headless runs
+           pass a stand in (see headless.py)'''
         self.engine = engine
 
         self.abilh = AbilityHandler()
-        self.abilh.load_dir('data/scenarios/%s/abilities/'%scenario)
+        self.abilh.load_dir(scenario_dir+'%s/abilities/'%scenario)
         self.abilh.load_dir('data/abilities/')
 
         self.unith = UnitHandler(self)
-        self.unith.load_dir('data/scenarios/%s/units/'%scenario)
+        self.unith.load_dir(scenario_dir+'%s/units/'%scenario)
         self.unith.load_dir('data/units/')
 
         self.units = []
+        self.units_by_gid = {}
+        self.table = UnitTable()
 
-        store = load_mod_file.load('data/scenarios/%s/config.py'%scenario)
+        store = load_mod_file.load(scenario_dir+'%s/config.py'%scenario)
         if store == False:
             print 'fail load config <%s>'%scenario
         else: self.config = store
@@ -187,25 +491,45 @@ class Scenario(object):
                   'engine':self.engine,
                   'parent':self,
                   'BaseScenario':BaseScenario,
-                  'gui':gui}
-        store = load_mod_file.load('data/scenarios/%s/scenario.py'%scenario, access)
+                  'gui':gui_lib}
+        store = load_mod_file.load(scenario_dir+'%s/scenario.py'%scenario, access)
         if store == False:
             print 'fail load scenario <%s>'%scenario
         else:
             self.mod = store.scenario(self)
 
-        access = {'BaseAI':AI}
-        store = load_mod_file.load('data/scenarios/%s/ai.py'%scenario, access)
+        access = {'BaseAI':AI,
+                  'BaseSearchAI':SearchAI}
+        store = load_mod_file.load(scenario_dir+'%s/ai.py'%scenario, access)
         if store == False:
             print 'fail load ai <%s>'%scenario
         else:
             self.core_ai = store.ai
+            if getattr(self.config, 'search_ai', False) and\
+               hasattr(store, 'search_ai'):
+                self.core_ai = store.search_ai
 
         self.ai_players = []
+        self.ai_time_budget = 0.01 #seconds of AI thinking per frame
+
+        self.winner_dirty = True
+        self.last_winner = None
 
     def setScenarioMess(self, *args, **kwargs):
         self.engine.setScenarioMess(*args, **kwargs)
 
+    def fire(self, name, *args):
+        '''Pass a simulation event on to the scenario mod, the winner has
+           to be worked out again afterwards'''
+        self.winner_dirty = True
+        mod = getattr(self, 'mod', None)
+        if mod:
+            getattr(mod, name)(*args)
+
+    def set_turn(self, team):
+        self.table.reset_ap(team)
+        self.fire('on_turn_changed', team)
+
     def make_ai_player(self, team):
         new = self.core_ai(self, team)
         self.ai_players.append(new)
@@ -214,27 +538,42 @@ class Scenario(object):
         new = self.unith.units[type](self)
         new.load_stats(stats)
         new.team = team
-        new.gfx_entity = self.engine.gfx.mapd.make_entity(new.image, new.pos, new.name, 'center')
-        new.team_flag = self.engine.gfx.mapd.make_entity('player-team-flag.png'+str(self.config.teams.index(team)),
-                                                       new.pos, new.name+'_flag', 'center')
+        gfx = self.engine.gfx
+        index = self.config.teams.index(team)
+        image = new.image
+        if new.team_colored:
+            image = gfx.get_team_image(image, index)
+        new.gfx_entity = gfx.mapd.make_entity(image, new.pos, new.name, 'center')
+        new.team_flag = gfx.mapd.make_entity(gfx.get_team_image('player-team-flag.png', index),
+                                             new.pos, new.name+'_flag', 'center')
         new.team_flag.bound_to = new.gfx_entity
         new.update()
         self.units.append(new)
+        self.units_by_gid[new.gid] = new
         return new
 
+    def get_unit(self, gid):
+        '''Return the unit with gid, or None'''
+        return self.units_by_gid.get(gid)
+
     def update(self):
         if self.engine.engine.am_master:
             turn = self.engine.engine.whos_turn
             for i in self.ai_players:
                 if i.team == turn:
-                    i.update()
+                    i.run_turn(self.ai_time_budget)
+                else:
+                    i.reset_turn()
         try:
             self.mod.update()
         except:
             pass
 
     def winner(self):
-        return self.mod.winner()
+        if self.winner_dirty:
+            self.winner_dirty = False
+            self.last_winner = self.mod.winner()
+        return self.last_winner
 
     def closeScenarioMess(self):
         self.mod.closeScenarioMess()
@@ -0,0 +1,95 @@
+"""Grid search helpers shared by the AI and abilities.
+
+Everything here works on plain (x, y) tuples so it can be used without a
+running gfx engine."""
+
+from collections import deque
+
+def get_neighbors(pos):
+    x, y = pos
+    yield x-1, y
+    yield x+1, y
+    yield x, y-1
+    yield x, y+1
+
+class DistanceField(object):
+    """Breadth first distances from a set of source tiles.
+
+       Built once, then every lookup is a dict access - so many units
+       can share the same field for a whole turn.
+       width/height are the map bounds
+       sources are the goal tiles (distance 0)
+       blocked are tiles that can't be walked through - sources are
+           always included even if they are blocked (ie an enemy unit)"""
+    def __init__(self, width, height, sources, blocked=()):
+        self.width = width
+        self.height = height
+        self.sources = tuple(sources)
+        self.dist = {}
+
+        self._build(blocked)
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def _build(self, blocked):
+        dist = self.dist
+        blocked = set(blocked)
+        todo = deque()
+        for s in self.sources:
+            s = int(s[0]), int(s[1])
+            if self.in_bounds(s) and not s in dist:
+                dist[s] = 0
+                todo.append(s)
+
+        while todo:
+            cur = todo.popleft()
+            d = dist[cur] + 1
+            for n in get_neighbors(cur):
+                if n in dist or n in blocked or not self.in_bounds(n):
+                    continue
+                dist[n] = d
+                todo.append(n)
+
+    def get(self, pos, default=None):
+        return self.dist.get(pos, default)
+
+    def best_of(self, tiles):
+        """Return the tile in tiles that is closest to a source, or None"""
+        best = None
+        best_d = None
+        for t in tiles:
+            d = self.dist.get(t)
+            if d is None:
+                continue
+            if best_d is None or d < best_d:
+                best = t
+                best_d = d
+        return best
+
+def reachable_tiles(start, budget, width, height, blocked, occupied=()):
+    """Return a {tile:steps} dict of every tile reachable from start
+       in at most budget steps.
+       blocked tiles can't be entered at all, occupied tiles can be walked
+       through but not stopped on (ie friendly units)"""
+    start = int(start[0]), int(start[1])
+    steps = {start:0}
+    todo = deque([start])
+    while todo:
+        cur = todo.popleft()
+        d = steps[cur] + 1
+        if d > budget:
+            continue
+        for n in get_neighbors(cur):
+            if n in steps or n in blocked:
+                continue
+            if not (0 <= n[0] < width and 0 <= n[1] < height):
+                continue
+            steps[n] = d
+            todo.append(n)
+
+    del steps[start]
+    for i in occupied:
+        if i in steps:
+            del steps[i]
+    return steps
@@ -0,0 +1,163 @@
+"""Per frame timings of the client's main loop.
+
+Each frame is split into named phases (events, network, mod/AI, map,
+entities, gui...), timed with begin/end around the code:
+
+    prof = profiler.profiler
+    prof.begin_frame()
+    prof.begin('events')
+    event_handler.update()
+    prof.end('events')
+    ...
+    prof.end_frame()
+
+Timings of the last frames can be drawn as a graph over the screen
+(render_overlay) and the last trace_size frames saved in the Chrome trace
+event format (save_trace) - open it in chrome://tracing or Perfetto."""
+
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import pygame
+from pygame.locals import *
+
+#overlay colour of each phase, others get grey
+phase_colors = {'network':(120,120,255),
+                'wait':(60,60,60),
+                'events':(255,255,0),
+                'mod':(255,60,60),
+                'map':(60,200,60),
+                'entities':(0,255,255),
+                'gui':(255,0,255),
+                'flip':(255,150,0)}
+
+class Frame(object):
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.phases = [] #(name, start, end) in the order they ended
+        self.open = {} #name:start
+
+    def get_time(self, name):
+        return sum(e-s for n, s, e in self.phases if n == name)
+
+class Profiler(object):
+    history = 120 #frames drawn by the overlay
+    trace_size = 1800 #frames kept for save_trace
+    def __init__(self):
+        self.enabled = True
+        self.show = False #draw the overlay
+
+        self.frames = []
+        self.cur = None
+        self.last_end = None
+        self.font = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.time()
+        self.cur = Frame(now)
+        if self.last_end:
+            #whatever ran between our frames - the network reactor
+            self.cur.phases.append(('network', self.last_end, now))
+            self.cur.start = self.last_end
+
+    def end_frame(self):
+        if not self.cur:
+            return
+        self.cur.end = self.last_end = time.time()
+        self.frames.append(self.cur)
+        if len(self.frames) > self.trace_size:
+            del self.frames[:len(self.frames)-self.trace_size]
+        self.cur = None
+
+    def begin(self, name):
+        if self.cur:
+            self.cur.open[name] = time.time()
+
+    def end(self, name):
+        if self.cur and name in self.cur.open:
+            self.cur.phases.append((name, self.cur.open.pop(name), time.time()))
+
+    def toggle(self):
+        self.show = not self.show
+
+    def get_averages(self, frames=None):
+        """Return {phase:mean ms} over the last frames (default history)"""
+        frames = self.frames[-(frames or self.history):]
+        if not frames:
+            return {}
+        ret = {}
+        for f in frames:
+            for name, s, e in f.phases:
+                ret[name] = ret.get(name, 0) + (e-s)*1000.0
+        for name in ret:
+            ret[name] /= len(frames)
+        return ret
+
+    def get_trace(self):
+        """The kept frames as a Chrome trace event dict"""
+        events = []
+        if not self.frames:
+            return {'traceEvents':events, 'displayTimeUnit':'ms'}
+        t0 = self.frames[0].start
+        for i, f in enumerate(self.frames):
+            events.append({'name':'frame', 'cat':'frame', 'ph':'X',
+                           'ts':(f.start-t0)*1000000.0,
+                           'dur':(f.end-f.start)*1000000.0,
+                           'pid':1, 'tid':1, 'args':{'frame':i}})
+            for name, s, e in f.phases:
+                events.append({'name':name, 'cat':'phase', 'ph':'X',
+                               'ts':(s-t0)*1000000.0,
+                               'dur':(e-s)*1000000.0,
+                               'pid':1, 'tid':1})
+        return {'traceEvents':events, 'displayTimeUnit':'ms'}
+
+    def save_trace(self, filename):
+        f = open(filename, 'w')
+        json.dump(self.get_trace(), f)
+        f.close()
+
+    def render_overlay(self, surf, rect=pygame.Rect(5, 85, 240, 120), scale=2):
+        """Draw frame times of the last frames as stacked bars - scale is
+           pixels per ms, the line marks 33ms (30 fps)"""
+        if not self.show:
+            return
+        bg = pygame.Surface(rect.size, SRCALPHA)
+        bg.fill((0,0,0,160))
+        surf.blit(bg, rect)
+
+        frames = self.frames[-self.history:]
+        w = max(1, rect.width/self.history)
+        for i, f in enumerate(frames):
+            x = rect.left + i*w
+            y = rect.bottom
+            for name, s, e in f.phases:
+                h = int((e-s)*1000*scale)
+                if h <= 0:
+                    continue
+                pygame.draw.rect(surf, phase_colors.get(name, (150,150,150)),
+                                 (x, y-h, w, h))
+                y -= h
+                if y < rect.top:
+                    break
+        y = rect.bottom - int(1000/30.0*scale)
+        if y > rect.top:
+            pygame.draw.line(surf, (255,255,255), (rect.left, y), (rect.right, y))
+
+        if not self.font:
+            self.font = pygame.font.Font(None, 16)
+        avg = self.get_averages()
+        y = rect.top + 2
+        for name in sorted(avg, key=lambda x: -avg[x]):
+            text = self.font.render('%s %.1fms'%(name, avg[name]), True,
+                                    phase_colors.get(name, (150,150,150)))
+            surf.blit(text, (rect.right+4, y))
+            y += text.get_height()
+
+profiler = Profiler()
@@ -0,0 +1,131 @@
+''' Tests for the AI lookahead search.
+'''
+
+import sys
+sys.path.insert(0, '..')
+
+from lib import ai_search
+
+import unittest, time
+
+MOVE = (0, ('move', 0, 0, 0))
+SWORD = (1, ('attack', 1, 1.0, 0))
+
+def make_state(units, size=(6,6), walls=(), goals=None):
+    '''units is a list of (team, pos, hp, ap)'''
+    state = ai_search.SimState(size, walls, goals or {})
+    for n, (team, pos, hp, ap) in enumerate(units):
+        state.add_unit(n, team, pos, hp, ap, 5, [MOVE, SWORD])
+    return state
+
+class TestSimState(unittest.TestCase):
+    '''Copies and team queries.'''
+    def test_copy_is_independent(self):
+        state = make_state([('red', (0,0), 10, 4)])
+        new = state.copy()
+        new.pos[0] = (1,1)
+        new.hp[0] = 3
+        self.assertEqual((0,0), state.pos[0])
+        self.assertEqual(10, state.hp[0])
+    def test_teams(self):
+        state = make_state([('red', (0,0), 10, 4),
+                            ('blue', (3,3), 10, 4),
+                            ('blue', (4,4), 0, 4)])
+        self.assertEqual([0], state.units_of('red'))
+        self.assertEqual([1], state.enemies_of('red'))
+        self.assertFalse(state.alive(2))
+
+class TestApplyAction(unittest.TestCase):
+    '''Moves and attacks on a SimState.'''
+    def test_move(self):
+        state = make_state([('red', (0,0), 10, 4)])
+        ai_search.apply_action(state, 0, (0, (1,2)))
+        self.assertEqual((1,2), state.pos[0])
+        self.assertEqual(1, state.ap[0])
+    def test_attack(self):
+        state = make_state([('red', (0,0), 10, 4), ('blue', (1,0), 7, 4)])
+        ai_search.apply_action(state, 0, (1, (1,0)))
+        self.assertEqual(2, state.hp[1])
+        self.assertEqual(0, state.ap[0])
+    def test_kill(self):
+        state = make_state([('red', (0,0), 10, 4), ('blue', (1,0), 3, 4)])
+        ai_search.apply_action(state, 0, (1, (1,0)))
+        self.assertEqual(0, state.hp[1])
+        self.assertEqual([], state.enemies_of('red'))
+
+class TestBeamSearch(unittest.TestCase):
+    '''Whole turn planning.'''
+    def test_attacks_adjacent_enemy(self):
+        state = make_state([('red', (0,0), 10, 4), ('blue', (1,0), 5, 4)],
+                           goals={'red':[(1,0)]})
+        score, line = ai_search.beam_search(state, 'red', [0], [],
+                                            time.time()+5)
+        self.assertEqual((0, (1, (1,0))), line[-1])
+    def test_moves_to_goal(self):
+        state = make_state([('red', (0,0), 10, 4), ('blue', (5,5), 5, 4)],
+                           goals={'red':[(5,5)]})
+        score, line = ai_search.beam_search(state, 'red', [0], [],
+                                            time.time()+5)
+        self.assertEqual(0, line[0][1][0])
+        self.assertEqual(3, sum(line[0][1][1]))
+    def test_steps_keep_best_so_far(self):
+        units = [('red', (0,i), 10, 4) for i in xrange(6)]
+        units.append(('blue', (5,5), 5, 4))
+        state = make_state(units, goals={'red':[(5,5)]})
+        search = ai_search.BeamSearch(state, 'red', state.units_of('red'))
+        self.assertFalse(search.step(0))
+        score, line = search.get_best()
+        self.assertTrue(line)
+        while not search.step(time.time()+1):
+            pass
+        self.assertTrue(search.is_done())
+        self.assertTrue(search.get_best()[0] >= score)
+
+class TestSearch(unittest.TestCase):
+    '''In process search, stepped like SearchAI does.'''
+    def test_finds_line(self):
+        state = make_state([('red', (0,0), 10, 4), ('blue', (1,0), 5, 4)],
+                           goals={'red':[(1,0)]})
+        search = ai_search.Search(state, 'red', 5, use_pool=False)
+        while not search.step():
+            pass
+        self.assertEqual((0, (1, (1,0))), search.line[-1])
+    def test_steps_are_bounded(self):
+        units = [('red', (0,i), 10, 4) for i in xrange(20)]
+        units.append(('blue', (19,19), 5, 4))
+        state = make_state(units, size=(20,20), goals={'red':[(19,19)]})
+        search = ai_search.Search(state, 'red', 5, use_pool=False)
+        search.step_time = 0.001
+        t = time.time()
+        search.step()
+        self.assertTrue(time.time()-t < 0.1)
+    def test_deadline_plays_partial_line(self):
+        units = [('red', (0,i), 10, 4) for i in xrange(20)]
+        units.append(('blue', (19,19), 5, 4))
+        state = make_state(units, size=(20,20), goals={'red':[(19,19)]})
+        search = ai_search.Search(state, 'red', 0, use_pool=False)
+        self.assertTrue(search.step())
+        self.assertTrue(search.line)
+    def test_no_units(self):
+        state = make_state([('blue', (1,0), 5, 4)])
+        search = ai_search.Search(state, 'red', 1, use_pool=False)
+        self.assertTrue(search.step())
+        self.assertEqual([], search.line)
+
+class TestPoolSearch(unittest.TestCase):
+    '''Search on the worker pool, when there is one.'''
+    def tearDown(self):
+        ai_search.close_pool()
+    def test_ends_by_deadline(self):
+        units = [('red', (0,i), 10, 4) for i in xrange(20)]
+        units.append(('blue', (19,19), 5, 4))
+        state = make_state(units, size=(20,20), goals={'red':[(19,19)]})
+        t = time.time()
+        search = ai_search.Search(state, 'red', 0.3)
+        while not search.step():
+            time.sleep(0.001)
+        self.assertTrue(time.time()-t < 0.305)
+        self.assertTrue(search.line)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+''' Tests for the background asset loader.
+'''
+
+import sys
+sys.path.insert(0, '..')
+
+from lib import asset_loader
+
+import unittest
+
+class TestAssetLoader(unittest.TestCase):
+    '''Files, steps and done callbacks.'''
+    def setUp(self):
+        self.loader = asset_loader.AssetLoader()
+        self.log = []
+    def tearDown(self):
+        self.loader.close()
+    def finish(self, path, data):
+        self.log.append(data)
+    def test_done_with_nothing_queued(self):
+        self.loader.on_done(lambda: self.log.append('done'))
+        self.assertTrue(self.loader.update())
+        self.assertEqual(['done'], self.log)
+    def test_files_then_steps(self):
+        for i in xrange(3):
+            self.loader.add('file%s'%i, lambda path: path.upper(), self.finish)
+        self.loader.add_step(lambda: self.log.append('step1'))
+        self.loader.add_step(lambda: self.log.append('step2'))
+        self.loader.on_done(lambda: self.log.append('done'))
+        self.loader.wait()
+        self.assertEqual(['FILE0', 'FILE1', 'FILE2'], sorted(self.log[:3]))
+        self.assertEqual(['step1', 'step2', 'done'], self.log[3:])
+        self.assertEqual((5, 5), self.loader.get_progress())
+    def test_failed_file(self):
+        def fail(path):
+            raise IOError(path)
+        self.loader.add('bad', fail, self.finish)
+        self.loader.add_step(lambda: self.log.append('step'))
+        self.loader.wait()
+        self.assertEqual(['bad'], self.loader.failed)
+        self.assertEqual(['step'], self.log)
+    def test_cancel(self):
+        self.loader.add_step(lambda: self.log.append('step'))
+        self.loader.on_done(lambda: self.log.append('done'))
+        self.loader.cancel()
+        self.loader.update()
+        self.assertEqual([], self.log)
+        self.assertEqual([], self.loader.threads)
+
+if __name__ == '__main__':
+    unittest.main()
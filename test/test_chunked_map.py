@@ -0,0 +1,61 @@
+''' Tests for the chunked tile and entity storage big maps use.
+'''
+
+import sys
+sys.path.insert(0, '..')
+
+from lib import chunked_map
+
+import unittest
+
+class Ent(object):
+    def __init__(self, name, tile):
+        self.name = name
+        self.tile = tile
+        self.pos = tile
+    def get_my_tile(self):
+        return self.tile
+
+class TestChunkedMap(unittest.TestCase):
+    '''Tiles and entities on a map that does not fill its last chunks.'''
+    def setUp(self):
+        self.m = chunked_map.ChunkedMap(20, 10, 8)
+    def test_chunk_count(self):
+        self.assertEqual(3, self.m.chunks_x)
+        self.assertEqual(2, self.m.chunks_y)
+    def test_tiles(self):
+        grid = [[(x+y)%3 for x in xrange(20)] for y in xrange(10)]
+        self.m.load_grid(grid)
+        self.assertEqual(grid[9][19], self.m.get_tile(19, 9))
+        self.m.set_tile(17, 3, 7)
+        self.assertEqual(7, self.m.get_tile(17, 3))
+    def test_chunks_in(self):
+        self.assertEqual(1, len(self.m.get_chunks_in((0, 0, 7, 7))))
+        self.assertEqual(6, len(self.m.get_chunks_in((-5, -5, 50, 50))))
+    def test_blocking(self):
+        a = Ent('blocking', (9, 9))
+        b = Ent('blocking', (9, 9))
+        self.m.add_entity(a, a.tile)
+        self.m.add_entity(b, b.tile)
+        self.m.remove_entity(a, a.tile)
+        self.assertEqual(set([(9, 9)]), self.m.blocking)
+        self.m.remove_entity(b, b.tile)
+        self.assertEqual(set(), self.m.blocking)
+    def test_entities_on_tile(self):
+        a = Ent('unit', (3, 4))
+        self.m.add_entity(a, a.tile)
+        self.assertEqual([a], self.m.get_entities_on_tile(3, 4))
+        self.assertEqual([], self.m.get_entities_on_tile(3, 5))
+        self.assertEqual([], self.m.get_entities_on_tile(30, 5))
+    def test_draw_order(self):
+        ents = [Ent('unit', t) for t in [(2, 5), (12, 1), (3, 5), (0, 9), (9, 2)]]
+        for i in ents:
+            self.m.add_entity(i, i.tile)
+        order = list(self.m.draw_order(self.m.chunks))
+        self.assertEqual([(12, 1), (9, 2), (3, 5), (2, 5), (0, 9)],
+                         [i.tile for i in order])
+        self.m.remove_entity(ents[2], ents[2].tile)
+        self.assertEqual(4, len(list(self.m.draw_order(self.m.chunks))))
+
+if __name__ == '__main__':
+    unittest.main()
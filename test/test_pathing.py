@@ -0,0 +1,44 @@
+''' Tests for the grid search helpers the AI plans with.
+'''
+
+import sys
+sys.path.insert(0, '..')
+
+from lib import pathing
+
+import unittest
+
+class TestDistanceField(unittest.TestCase):
+    '''Multi-source distances over a small open map.'''
+    def test_sources_are_zero(self):
+        field = pathing.DistanceField(5, 5, [(0,0), (4,4)])
+        self.assertEqual(0, field.get((0,0)))
+        self.assertEqual(0, field.get((4,4)))
+    def test_nearest_source(self):
+        field = pathing.DistanceField(5, 5, [(0,0), (4,4)])
+        self.assertEqual(2, field.get((1,1)))
+        self.assertEqual(1, field.get((4,3)))
+    def test_walks_around_walls(self):
+        walls = [(1,0), (1,1), (1,2), (1,3)]
+        field = pathing.DistanceField(5, 5, [(0,0)], walls)
+        self.assertEqual(10, field.get((2,0)))
+        self.assertEqual(None, field.get((1,0)))
+    def test_enclosed_tile(self):
+        field = pathing.DistanceField(3, 3, [(0,0)], [(0,1), (1,0)])
+        self.assertEqual(None, field.get((2,2)))
+    def test_best_of(self):
+        field = pathing.DistanceField(5, 5, [(4,4)])
+        self.assertEqual((3,4), field.best_of([(0,0), (3,4), (2,2)]))
+        self.assertEqual(None, field.best_of([]))
+
+class TestReachable(unittest.TestCase):
+    '''Bounded move search used for unit movement.'''
+    def test_budget(self):
+        tiles = pathing.reachable_tiles((2,2), 1, 5, 5, set())
+        self.assertEqual(set([(1,2), (3,2), (2,1), (2,3)]), set(tiles))
+    def test_blocked_and_occupied(self):
+        tiles = pathing.reachable_tiles((0,0), 2, 5, 5, set([(1,0)]), [(0,1)])
+        self.assertEqual({(0,2):2, (1,1):2}, tiles)
+
+if __name__ == '__main__':
+    unittest.main()
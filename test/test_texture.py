@@ -0,0 +1,40 @@
+''' Tests for texture regions - no GL needed, only coords.
+'''
+
+import sys
+sys.path.insert(0, '..')
+
+from lib.engine import texture
+
+import unittest
+
+def make_texture(size, gl_size):
+    '''A texture as one packed on an atlas page would be'''
+    tex = texture.Texture.__new__(texture.Texture)
+    tex._gl_tex = None
+    tex.size = size
+    tex.gl_size = gl_size
+    tex.area = (0, 0) + size
+    tex.size_mult = (size[0]*1.0/gl_size[0], size[1]*1.0/gl_size[1])
+    return tex
+
+class TestTextureRegion(unittest.TestCase):
+    '''Regions of atlas regions, as the gui theme makes them.'''
+    def setUp(self):
+        self.page = make_texture((256, 256), (256, 256))
+        self.region = texture.TextureRegion(self.page, (100, 40, 120, 60))
+    def test_region_of_region_area(self):
+        sub = self.region.get_region((7, 7, 13, 13))
+        self.assertEqual((107, 47, 113, 53), sub.area)
+        self.assertEqual((6, 6), sub.size)
+        self.assertTrue(sub.tex is self.page)
+    def test_region_of_region_coords(self):
+        sub = self.region.get_region((7, 7, 13, 13))
+        self.assertEqual(self.page.coord(107, 47), sub.coord(0, 0))
+        self.assertEqual(self.page.coord(113, 53), sub.coord(6, 6))
+    def test_clamped_to_parent(self):
+        sub = self.region.get_region((10, 10, 50, 50))
+        self.assertEqual((110, 50, 120, 60), sub.area)
+
+if __name__ == '__main__':
+    unittest.main()